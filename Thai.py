@@ -1,12 +1,26 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
-from datetime import datetime, timedelta
-import edge_tts
+from datetime import datetime
 import asyncio
+import os
+import time
 import random
+from concurrent.futures import ThreadPoolExecutor
 from streamlit_mic_recorder import speech_to_text
-from rapidfuzz import fuzz
 from streamlit_gsheets import GSheetsConnection  
+from audio_cache import AudioCache, deck_tts_texts, prewarm, synthesize_batch
+from review_log import ReviewJournal
+from deck_snapshot import DeckSnapshot
+from scheduler import DueScheduler, WEIGHTINGS
+from progress import SharedDeck, ProgressOverlay
+from storage import GSheetsStorage, SQLiteStorage, now_ms
+from profiling import PerfRecorder, begin_rerun, end_rerun
+from srs import review_outcome, simulate_workload, CATEGORY_MODES
+from session import MC_MODES, plan_session
+from handwriting import find_font, score_handwriting
+from speech import MISSED_BELOW, score_speech
+from history import OWNER, shared_history
 
 # === [保留] 只需要畫布套件 ===
 from streamlit_drawable_canvas import st_canvas
@@ -18,7 +32,24 @@ import numpy as np
 # ==========================================
 st.set_page_config(page_title="Thai Master SRS 🇹🇭", page_icon="🐘", layout="centered")
 
-st.markdown("""
+# 本地快取 (音檔、牌組快照、journal、進度…) 都放這裡；THAI_CACHE_DIR 可以改位置 (benchmark 用)
+CACHE_DIR = os.environ.get("THAI_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# === 效能量測：各階段耗時 (整個 process 共用) ===
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+
+@st.cache_resource
+def get_perf():
+    return PerfRecorder()
+
+def timed(stage):
+    return get_perf().span(stage, st.session_state.perf)
+
+if 'perf' not in st.session_state: st.session_state.perf = {}
+begin_rerun(get_perf(), st.session_state.perf, profile=st.session_state.pop('profile_next_rerun', False), profile_dir=PROFILE_DIR)
+
+with timed("css"):
+    st.markdown("""
 <style>
     .stApp { background-color: #fdfbf7; }
     
@@ -82,125 +113,194 @@ st.markdown("""
 # 2. 資料處理函式 (移到前面，讓 Sidebar 找得到)
 # ==========================================
 
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-def load_data():
+def gsheets_settings():
+    # st.connection("gsheets") 用的同一份設定 (secrets 的 [connections.gsheets])；沒有 secrets 就是 None
     try:
-        df = conn.read(worksheet="Sheet1", ttl=0)
-    except Exception as e:
-        st.error(f"無法讀取 Google Sheet: {e}")
-        return pd.DataFrame()
-
-    df.columns = df.columns.str.strip()
-    required_cols = ['Thai', 'TTS_Text', 'Pronunciation', 'Meaning', 'Category', 'Times', 'Next']
-    for col in required_cols:
-        if col not in df.columns:
-            if col == 'Times': df[col] = 0
-            elif col == 'Next': df[col] = datetime.now().date()
-            else: df[col] = ""
-    
-    text_cols = ['Thai', 'TTS_Text', 'Pronunciation', 'Meaning', 'Category']
-    for col in text_cols:
-        # 1. 確保是文字格式且沒有 nan
-        df[col] = df[col].fillna("").astype(str).replace(["nan", "None", "<NA>"], "")
-        # 2. 【脫掉防護衣】如果讀取進來的字串開頭有單引號，把它拿掉，才不會影響畫面顯示
-        df[col] = df[col].apply(lambda x: x[1:] if x.startswith("'") else x)
-
-    df['Times'] = pd.to_numeric(df['Times'], errors='coerce').fillna(0).astype(int)
-    df['Next'] = pd.to_datetime(df['Next'], errors='coerce').fillna(pd.Timestamp.now()).dt.date
-    
-    return df[df['Thai'].str.strip() != ""]
+        return dict(st.secrets["connections"]["gsheets"])
+    except Exception:
+        return None
+
+@st.cache_resource
+def get_sheet_storage():
+    return GSheetsStorage(st.connection("gsheets", type=GSheetsConnection), worksheet="Sheet1",
+                          settings=gsheets_settings())
+
+@st.cache_resource
+def get_storage():
+    # THAI_STORAGE=sqlite：離線、本地測試用；預設還是 Google Sheet
+    if os.environ.get("THAI_STORAGE", "gsheets").lower() == "sqlite":
+        return SQLiteStorage(os.environ.get("THAI_SQLITE_PATH", os.path.join(CACHE_DIR, "thai.db")))
+    return get_sheet_storage()
+
+@st.cache_resource
+def get_deck_snapshot():
+    return DeckSnapshot(os.path.join(CACHE_DIR, "deck", get_storage().name))
 
-def save_data(df):
-    try:
-        save_df = df.copy()
-        save_df['Next'] = pd.to_datetime(save_df['Next']).dt.strftime('%Y-%m-%d')
-        
-        # 【穿上防護衣】在寫入 Google Sheets 之前，強制在文字前面加上單引號 (')
-        # 這會阻止 Google Sheets 把泰文數字轉換成阿拉伯數字
-        text_cols = ['Thai', 'TTS_Text', 'Pronunciation', 'Meaning', 'Category']
-        for col in text_cols:
-            if col in save_df.columns:
-                save_df[col] = save_df[col].astype(str).apply(lambda x: f"'{x}" if not x.startswith("'") else x)
-
-        conn.update(worksheet="Sheet1", data=save_df)
-        st.cache_data.clear() 
-    except Exception as e:
-        st.error(f"⚠️ 無法存檔至 Google Sheet：{e}")
+def load_data():
+    storage = get_storage()
+    snapshot = get_deck_snapshot()
+    revision = storage.revision()
+
+    # 遠端版本沒變 → 直接開本地快照，不讀整張表
+    df = snapshot.load(revision) if revision is not None else None
+    if df is None:
+        try:
+            with timed("storage_read"):
+                df = storage.load()
+        except Exception as e:
+            st.error(f"無法讀取 Google Sheet: {e}")
+            return pd.DataFrame()
+        snapshot.save(df, revision)
+
+    # 還沒同步上去的作答蓋回去，畫面才不會倒退
+    return get_review_journal().overlay(df)
+
+def push_review_deltas(deltas):
+    # 背景執行緒呼叫：交給儲存後端只寫有變動、而且比遠端新的列
+    storage = get_storage()
+    snapshot = get_deck_snapshot()
+    # 寫入前遠端版本 == 快照版本，代表中間沒有別人改過，寫完後的新版本就是我們的
+    before = storage.revision()
+    rejected = storage.apply_reviews(deltas) or {}
+    if before is not None and before == snapshot.revision():
+        # 遠端比較新的列 (別台裝置的作答) 用遠端的值，快照跟遠端一致
+        snapshot.apply_deltas({**deltas, **rejected}, storage.revision())
+    else:
+        snapshot.invalidate()
+    return rejected
+
+SYNC_INTERVAL = 60  # 秒；整頁重跑時最多這麼久拉一次遠端的變動
+
+def pull_remote_changes(deck, force=False):
+    # 只拉遠端 Updated 比本地新的列，newer-wins 合併進共用的 deck；回傳收下幾列
+    # deck.synced_revision 是 deck 的進度已經跟上的遠端版本，跟快照的版本分開記：
+    # 遠端版本也涵蓋卡片內容的變動，這裡只拉進度，快照不能因此被標成最新 (只有整張重讀才更新快照)
+    storage = get_storage()
+    revision = deck.synced_revision
+    merged = {}
+    current = storage.revision()
+    # 拿不到版本 (Sheet 不是 service account) 就沒辦法便宜地知道哪裡變了：只有按「同步」才讀
+    if (current is not None and current != revision) or (current is None and force):
+        changes = storage.changes_since(revision, known=deck.updated_series())
+        for label, t, n, u in zip(changes.index, changes['Times'], changes['Next'], changes['Updated']):
+            merged[label] = {'Times': int(t), 'Next': n.isoformat(), 'Updated': int(u)}
+    # 背景同步時被遠端擋下來的列也一起收 (讀遠端成功之後才拿，失敗的話留到下一次)
+    for label, delta in get_review_journal().take_rejected().items():
+        if label not in merged or delta['Updated'] > merged[label]['Updated']:
+            merged[label] = delta
+    applied = deck.apply_remote(merged)
+    deck.synced_revision = current
+    st.session_state.last_pull = time.time()
+    return len(applied)
+
+def sync_remote(deck, progress, scheduler):
+    # 多裝置同步：定時拉遠端變動的列 (沒變就只問一次版本)，再把收下的列更新到這個 session 的到期佇列。
+    # 答題區 (fragment) 每次重跑都會呼叫，讀書中沒有整頁重跑也會照 SYNC_INTERVAL 拉；
+    # 這裡不能寫側邊欄，結果放 sync_note 由 panel_status 顯示
+    if time.time() - st.session_state.get('last_pull', 0) > SYNC_INTERVAL:
+        try:
+            with timed("pull"):
+                pulled = pull_remote_changes(deck, force=st.session_state.pop('force_pull', False))
+            if pulled:
+                st.session_state.sync_note = f"🔃 收到其他裝置的 {pulled} 筆進度"
+        except Exception as e:
+            st.session_state.last_pull = time.time()
+            st.session_state.sync_note = f"⚠️ 拉取遠端進度失敗：{e}"
+    sync_scheduler(deck, progress, scheduler)
+
+def sync_scheduler(deck, progress, scheduler):
+    # 擁有者的其他分頁或別台裝置合併進 deck 的列：比較新的才抄進這個 session，只更新到期佇列裡那幾張
+    seen = st.session_state.get('remote_seen', 0)
+    labels = deck.remote_log[seen:]
+    st.session_state.remote_seen = seen + len(labels)
+    if progress.owner:
+        for label in progress.follow_deck(labels):
+            scheduler.update(label, progress[label, 'Times'], progress[label, 'Next'])
+
+@st.cache_resource
+def get_review_journal():
+    return ReviewJournal(push_review_deltas, path=os.path.join(CACHE_DIR, "review_journal.jsonl"))
+
+@st.cache_resource
+def get_shared_deck():
+    # 卡片內容整個 process 只讀一份，所有使用者共用
+    # 版本在讀之前先拿：中間有人改的話下一次 pull 會再拉一次，不會漏
+    revision = get_storage().revision()
+    deck = SharedDeck(load_data())
+    deck.synced_revision = revision
+    return deck
+
+def record_review(progress, idx):
+    progress[idx, 'Updated'] = now_ms()  # 這一列的版本 = 作答時間，多裝置同步時比新舊
+    session = st.session_state.get('study_session')
+    if session is not None:
+        # 題組進行中：結果先留在記憶體，整組做完再一次存 (finish_session)
+        session.record(idx, progress[idx, 'Times'], progress[idx, 'Next'], progress[idx, 'Updated'])
+    else:
+        with timed("save"):
+            if progress.path:
+                # 有名字的同學：進度只存在自己的本地檔案 (幾 KB)
+                progress.save()
+            elif progress.owner:
+                # 擁有者：作答後只記一筆 journal，由背景執行緒合併後寫回，UI 不用等；
+                # 同時合併進共用的 deck，擁有者的其他分頁下一次 rerun 就會跟上
+                get_review_journal().record(idx, progress[idx, 'Times'], progress[idx, 'Next'], progress[idx, 'Updated'])
+                progress.deck.apply_remote({idx: progress.delta(idx)})
+            # 訪客 (沒有名字、沒開擁有者模式)：結果只留在這個 session
+    # 到期佇列只更新這一張卡
+    if 'scheduler' in st.session_state:
+        st.session_state.scheduler.update(idx, progress[idx, 'Times'], progress[idx, 'Next'])
+    record_attempt(progress, idx)
+
+def get_history():
+    return shared_history(os.path.join(CACHE_DIR, "history"))
+
+def record_attempt(progress, idx):
+    # 每次評分都追加一筆到作答紀錄 (統計頁用)；result_info 在呼叫 record_review 之前已經填好。
+    # 擁有者記成 OWNER；訪客的進度本來就不存，也不記 (不然統計頁會跟擁有者混在一起)
+    user = st.session_state.get('user', "").strip() or (OWNER if progress.owner else None)
+    if user is None:
+        return
+    res = st.session_state.get('result_info', {})
+    q = st.session_state.get('quiz_data', {})
+    shown = st.session_state.get('card_shown_at')
+    latency_ms = (time.time() - shown[1]) * 1000 if shown and shown[0] == idx else None
+    with timed("history"):
+        get_history().record(idx, q.get('mode'), q.get('category'), res.get('is_correct', False),
+                             score=res.get('score'), user_input=res.get('user_input'),
+                             latency_ms=latency_ms, user=user)
+
+@st.cache_resource
+def get_audio_cache():
+    # 整個 process 共用一份：記憶體 LRU + 硬碟快取 (以 voice + 文字的 hash 當 key)
+    cache_dir = os.environ.get("THAI_AUDIO_CACHE_DIR", os.path.join(CACHE_DIR, "audio"))
+    return AudioCache(cache_dir=cache_dir)
 
 async def generate_audio(text):
     try:
-        communicate = edge_tts.Communicate(text, "th-TH-PremwadeeNeural")
-        audio_data = b""
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                audio_data += chunk["data"]
-        return audio_data
+        return await get_audio_cache().get(text)
     except:
         return b""
 
-def get_distractors(df, current_row, n=3):
-    category = current_row['Category']
-    pool = df[(df['Category'] == category) & (df['Thai'] != current_row['Thai'])]
-    if len(pool) < n:
-        return pool.sample(len(pool)).to_dict('records')
-    return pool.sample(n).to_dict('records')
-
-# ==========================================
-# 3. 側邊欄與 Session State 初始化
-# ==========================================
-with st.sidebar:
-    if st.button("🔄 Reload Data"):
-        st.session_state.df = load_data()
-        st.session_state.current_idx = None
-        st.session_state.stage = 'quiz'
-        st.session_state.show_answer = False # 重置手寫狀態
-        st.rerun()
-
-if 'df' not in st.session_state: st.session_state.df = load_data()
-if 'current_idx' not in st.session_state: st.session_state.current_idx = None
-if 'last_idx' not in st.session_state: st.session_state.last_idx = None 
-if 'quiz_data' not in st.session_state: st.session_state.quiz_data = {}
-if 'mode_status' not in st.session_state: st.session_state.mode_status = "" 
-if 'stage' not in st.session_state: st.session_state.stage = 'quiz' 
-if 'result_info' not in st.session_state: st.session_state.result_info = {}
-if 'show_answer' not in st.session_state: st.session_state.show_answer = False 
-
-st.title("🇹🇭 Thai Master SRS")
-
-df = st.session_state.df
-today = datetime.now().date()
+def get_distractors(df, current_row, n=3, hard=False, field='Thai'):
+    # 牌組載入時建好的索引：同類別 row id 陣列 + (困難模式) 預先算好的相似鄰居
+    labels = get_shared_deck().distractors.pick(current_row.name, n=n, hard=hard, field=field)
+    return df.loc[labels].to_dict('records')
 
-# ==========================================
-# 4. 邏輯流程
-# ==========================================
+def mode_status_text(scheduler):
+    due_count = scheduler.due_count()
+    return f"📝 複習模式 (剩 {due_count} 題)" if due_count else "🔀 隨機練習模式"
 
-# --- A. 選題階段 ---
-if st.session_state.current_idx is None and st.session_state.stage == 'quiz':
-    due_indices = df[df['Next'] <= today].index.tolist()
-    target_pool = []
-    
-    if due_indices:
-        target_pool = due_indices
-        st.session_state.mode_status = f"📝 複習模式 (剩 {len(due_indices)} 題)"
-    else:
-        target_pool = df.index.tolist()
-        st.session_state.mode_status = "🔀 隨機練習模式"
+def choose_next_card(scheduler, exclude):
+    if scheduler.due_count():
+        return scheduler.pick_due(exclude=exclude), mode_status_text(scheduler)
+    return scheduler.pick_any(exclude=exclude), mode_status_text(scheduler)
 
-    if len(target_pool) > 1 and st.session_state.last_idx in target_pool:
-        target_pool.remove(st.session_state.last_idx)
-    
-    if not target_pool:
-        st.warning("資料庫空的，請檢查 Google Sheet。")
-        st.stop()
-        
-    idx = random.choice(target_pool)
-    st.session_state.current_idx = idx
+def build_quiz_data(df, idx, current_times, hard_distractors=False):
     row = df.loc[idx]
     
     tts_text = row['TTS_Text'] if pd.notna(row['TTS_Text']) and str(row['TTS_Text']).strip() != "" else row['Thai']
     category = row['Category']
-    current_times = int(row['Times'])
     
     mode = ""
     options = []
@@ -221,242 +321,576 @@ if st.session_state.current_idx is None and st.session_state.stage == 'quiz':
         possible = ['sentence_listen_to_meaning', 'speaking_sentence_text', 'speaking_sentence_shadowing']
         mode = random.choice(possible)
 
-    if mode in ['char_pron_to_thai', 'char_thai_to_meaning', 'word_thai_to_meaning', 'word_listen_to_thai', 'sentence_listen_to_meaning']:
-        distractors = get_distractors(df, row)
+    if mode in MC_MODES:
+        field = 'Thai' if mode in ['char_pron_to_thai', 'word_listen_to_thai'] else 'Meaning'
+        distractors = get_distractors(df, row, hard=hard_distractors, field=field)
         opts = distractors + [row.to_dict()]
         random.shuffle(opts)
         options = opts
 
-    st.session_state.quiz_data = {
+    return {
         'mode': mode,
         'tts_text': tts_text,
         'thai': row['Thai'],
         'meaning': row['Meaning'],
         'pronunciation': row['Pronunciation'],
+        'category': category,
         'options': options
     }
-    st.rerun()
 
-# --- B. 顯示階段 ---
-if st.session_state.current_idx is not None:
-    idx = st.session_state.current_idx
-    row = df.loc[idx]
-    q = st.session_state.quiz_data
-    mode = q['mode']
+# ==========================================
+# 預先準備下一題 (使用者作答時，背景先把下一題的音檔生好)
+# ==========================================
+@st.cache_resource
+def get_prefetch_pool():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+def start_prefetch(df, progress, scheduler, current_idx, settings):
+    # 選題跟出選項都很便宜，直接在這裡做；慢的 TTS 丟到背景執行緒
+    idx, _ = choose_next_card(scheduler, exclude=current_idx)
+    if idx is None or idx == current_idx:
+        # 只剩這一張到期 (pick_due 沒有別張可選)：答完之後它多半就不到期了，
+        # 預先準備一定會被 prefetch_is_valid 丟掉，不要每次 rerun 都送一個 TTS 工作
+        return
+    q = build_quiz_data(df, idx, progress[idx, 'Times'], hard_distractors=settings[1])
+    cache = get_audio_cache()
+    audio = get_prefetch_pool().submit(lambda: asyncio.run(cache.get(q['tts_text'])))
+    st.session_state.prefetch = {
+        'idx': idx, 'quiz_data': q, 'audio': audio, 'after': current_idx,
+        'was_due': scheduler.due_count() > 0, 'settings': settings, 'deck': id(df),
+    }
+
+def prefetch_is_valid(pf, df, scheduler, current_idx, settings):
+    # 作答會改變到期佇列：預先選好的卡必須還符合現在的佇列狀態
+    if pf is None or pf['after'] != current_idx or pf['settings'] != settings or pf['deck'] != id(df):
+        return False
+    if pf['idx'] == current_idx or pf['idx'] not in df.index:
+        return False
+    is_due = scheduler.due_count() > 0
+    if is_due != pf['was_due']:
+        return False
+    return not is_due or scheduler.is_due(pf['idx'])
+
+# ==========================================
+# 題組模式 (一次規劃 N 題，做完一起存檔)
+# ==========================================
+def start_session(deck, progress, today, size, weighting, hard_distractors):
+    session = plan_session(deck, progress, today, size, weighting, hard_distractors)
+    # 所有題目的音檔一起丟到背景合成
+    session.audio = synthesize_batch(get_audio_cache(), [q['tts_text'] for q in session.quiz_data],
+                                     get_prefetch_pool())
+    st.session_state.study_session = session
+    st.session_state.pop('prefetch', None)
+    return session
+
+def finish_session(progress):
+    session = st.session_state.pop('study_session', None)
+    if session is None or not session.results:
+        return session
+    with timed("save"):
+        if progress.path:
+            progress.save()
+        elif progress.owner:
+            get_review_journal().record_many(session.results)
+            progress.deck.apply_remote({label: progress.delta(label) for label in session.results})
+    return session
+
+def card_audio(idx, text):
+    # 同一張卡只拿一次音檔，之後的 rerun (畫布、作答、看結果) 直接用 session 裡的
+    cached = st.session_state.get('card_audio')
+    if cached is not None and cached[0] == (idx, text):
+        return cached[1]
+    audio = None
+    # 如果這張卡是預先準備好的，等背景的 TTS 做完就好，不用再叫一次
+    pending = st.session_state.get('audio_future')
+    if pending is not None and pending[0] == idx:
+        audio = pending[1].result()
+    if not audio:
+        audio = asyncio.run(generate_audio(text))
+    if audio:
+        st.session_state.card_audio = ((idx, text), audio)
+    return audio
+
+def forecast_workload(times, next_days, categories, today_ordinal, accuracy, days, runs):
+    # accuracy 是 ((類別, p), ...)；大牌組 simulate_workload 會自己少跑幾次，回傳 (表, 實際次數)
+    result = simulate_workload(times, next_days, categories, today_ordinal,
+                               days=days, runs=runs, accuracy=dict(accuracy), seed=0)
+    return pd.DataFrame({
+        "平均": result["due_mean"], "p10": result["due_p10"], "p90": result["due_p90"],
+    }, index=pd.RangeIndex(days, name="天")), result["runs"]
+
+# ==========================================
+# 3. 側邊欄與 Session State 初始化
+# ==========================================
+with st.sidebar:
+    if st.button("🔄 Reload Data"):
+        if 'progress' in st.session_state:
+            finish_session(st.session_state.progress)
+        get_review_journal().flush()  # 先把還沒同步的作答送出去再重新讀表
+        get_shared_deck.clear()
+        st.session_state.pop('progress', None)
+        st.session_state.pop('scheduler', None)
+        st.session_state.pop('prefetch', None)
+        st.session_state.current_idx = None
+        st.session_state.stage = 'quiz'
+        st.session_state.show_answer = False # 重置手寫狀態
+        st.rerun()
+
+    user = st.text_input("👤 名字 (空白 = 擁有者 / 訪客)", key="user").strip()
+    owner_mode = False
+    if not user:
+        # 沒設定 THAI_OWNER_PIN (自己用)：跟以前一樣預設就是擁有者，作答寫回 Google Sheet；
+        # 有設定 PIN (公開部署) 才要自己打開擁有者模式並輸入 PIN，沒打開就是訪客，進度不會存
+        pin = os.environ.get("THAI_OWNER_PIN")
+        owner_mode = st.toggle("🔑 擁有者模式 (進度寫回 Google Sheet)", value=not pin, key="owner_mode")
+        if owner_mode and pin and st.text_input("PIN", type="password", key="owner_pin") != pin:
+            owner_mode = False
+    weighting = st.selectbox("🎯 出題權重", list(WEIGHTINGS), format_func=WEIGHTINGS.get)
+    hard_distractors = st.toggle("🧩 相似干擾選項 (困難模式)")
+    auto_grade = st.toggle("🤖 手寫自動評分", value=find_font() is not None, disabled=find_font() is None,
+                           help=None if find_font() else "找不到泰文字型 (可設定 THAI_FONT_PATH)")
+
+    if st.button("📥 預先下載全部音檔"):
+        # 網路不好之前先跑一次；已經下載過的會略過，中斷了再按一次就會接著下載
+        bar = st.progress(0.0, text="準備中...")
+        def show_progress(done, total, failed):
+            bar.progress(done / total if total else 1.0, text=f"{done}/{total} (失敗 {failed})")
+        result = asyncio.run(prewarm(get_audio_cache(), deck_tts_texts(get_shared_deck().content), progress=show_progress))
+        st.caption(f"✅ 新下載 {result['synthesized']} 個，失敗 {len(result['failed'])} 個")
+
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        with st.expander("🗄️ 本地 SQLite"):
+            if st.button("⬇️ 從 Google Sheet 匯入", disabled=not storage.is_empty()):
+                storage.write_all(get_sheet_storage().load())
+                get_shared_deck.clear()
+                st.rerun()
+            if st.button("🔁 跟 Google Sheet 雙向同步"):
+                get_review_journal().flush()
+                pushed, pulled = storage.sync_to(get_sheet_storage())
+                st.session_state.sync_note = f"✅ 送出 {pushed} 列、收下 {pulled} 列"
+                st.session_state.last_pull = 0  # 收下的列在這次重跑的答題區併進牌組
+
+    if st.button("🔃 同步"):
+        # 先送出還沒同步的作答，再拉別台裝置的變動
+        get_review_journal().flush()
+        st.session_state.last_pull = 0
+        st.session_state.force_pull = True
+    if st.toggle("🐢 效能面板"):
+        perf = get_perf()
+        st.dataframe(pd.DataFrame(perf.summary()), hide_index=True, use_container_width=True)
+        st.caption(f"🔊 音檔快取：{get_audio_cache().stats()}")
+        col1, col2 = st.columns(2)
+        col1.download_button("JSON", perf.to_json(), file_name="thai_perf.json", mime="application/json")
+        col2.download_button("CSV", perf.to_csv(), file_name="thai_perf.csv", mime="text/csv")
+        if st.button("🔬 下一次 rerun 跑 cProfile"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+        if st.session_state.perf.get('last_profile'):
+            with st.expander("最近一次 cProfile (前 25 名)"):
+                st.code(st.session_state.perf['last_profile'])
+
+if 'current_idx' not in st.session_state: st.session_state.current_idx = None
+if 'last_idx' not in st.session_state: st.session_state.last_idx = None 
+if 'quiz_data' not in st.session_state: st.session_state.quiz_data = {}
+if 'mode_status' not in st.session_state: st.session_state.mode_status = "" 
+if 'stage' not in st.session_state: st.session_state.stage = 'quiz' 
+if 'result_info' not in st.session_state: st.session_state.result_info = {}
+if 'show_answer' not in st.session_state: st.session_state.show_answer = False 
+
+st.title("🇹🇭 Thai Master SRS")
+
+with timed("load_deck"):
+    deck = get_shared_deck()
+df = deck.content
+today = datetime.now().date()
+
+if hard_distractors and deck.distractors is not None:
+    # 困難模式的相似鄰居在背景建 (整個 process 只建一次)，建好之前先用同類別隨機的選項
+    deck.distractors.prepare(get_prefetch_pool())
+    if not deck.distractors.ready('Thai') or not deck.distractors.ready('Meaning'):
+        st.sidebar.caption("⏳ 相似干擾選項建立中，先用隨機選項")
+
+# 每個使用者只存自己的 Times / Next 陣列，卡片內容都讀共用的 deck
+progress_key = (user, owner_mode, id(deck))
+if st.session_state.get('progress_key') != progress_key:
+    if 'progress' in st.session_state:
+        finish_session(st.session_state.progress)  # 換人之前先把上一位的題組存掉
+    if user:
+        st.session_state.progress = ProgressOverlay.for_user(deck, user, os.path.join(CACHE_DIR, "progress"))
+    else:
+        st.session_state.progress = ProgressOverlay.from_sheet(deck, owner=owner_mode)
+    st.session_state.progress_key = progress_key
+    st.session_state.pop('scheduler', None)
+    st.session_state.pop('prefetch', None)
+    st.session_state.current_idx = None
+    st.session_state.stage = 'quiz'
+progress = st.session_state.progress
+
+if 'scheduler' not in st.session_state or st.session_state.scheduler.weighting != weighting:
+    st.session_state.scheduler = DueScheduler.from_progress(progress, today, weighting)
+    st.session_state.remote_seen = len(deck.remote_log)  # 新建的佇列已經包含之前收下的列
+scheduler = st.session_state.scheduler
+scheduler.set_today(today)
+
+with st.sidebar:
+    if 'session_done' in st.session_state:
+        st.toast(st.session_state.pop('session_done'))
+    session = st.session_state.get('study_session')
+    if session is None:
+        session_size = st.number_input("📚 題組題數", min_value=5, max_value=200, value=20, step=5)
+        if st.button("▶️ 開始題組"):
+            with timed("plan"):
+                start_session(deck, progress, today, int(session_size), weighting, hard_distractors)
+            st.session_state.current_idx = None
+            st.session_state.stage = 'quiz'
+            st.session_state.show_answer = False
+            st.rerun()
+    else:
+        # 題組進度條在答題區 (panel_status)，fragment 重跑時也會更新
+        if st.button("⏹️ 結束題組並存檔"):
+            finish_session(progress)
+            st.session_state.current_idx = None
+            st.session_state.stage = 'quiz'
+            st.session_state.show_answer = False
+            st.rerun()
+
+    if st.toggle("📈 未來複習量預測"):
+        # 用目前的進度模擬 N 天，先看改公式前的每日到期卡數
+        days = st.slider("天數", 7, 90, 30)
+        runs = st.select_slider("模擬次數", [200, 500, 1000, 2000], value=1000)
+        accuracy = tuple(
+            (category, st.slider(f"{category} 答對率", 0.0, 1.0, 0.8, 0.05, key=f"acc_{category}"))
+            for category in CATEGORY_MODES
+        )
+        # 按了才算：每答一題進度都會變，自動重算的話每次 rerun 都要跑一次模擬
+        if st.button("📈 計算預測"):
+            with timed("forecast"):
+                st.session_state.forecast = forecast_workload(
+                    progress.times, progress.next_days, deck.content['Category'].to_numpy(),
+                    today.toordinal(), accuracy, days, runs)
+        if 'forecast' in st.session_state:
+            forecast, ran = st.session_state.forecast
+            st.line_chart(forecast)
+            st.caption(f"接下來 {len(forecast)} 天平均每天 {forecast['平均'].mean():.0f} 張到期 (模擬 {ran} 次)")
+
+# ==========================================
+# 4. 邏輯流程
+# ==========================================
+# 整個答題區是一個 st.fragment：作答、畫布、下一題都只重跑這一塊，
+# CSS、側邊欄、牌組 / 進度載入不會跟著重跑。
+
+def rerun_panel():
+    # fragment 自己重跑的時候只重跑答題區；整頁重跑中 (例如 AppTest、側邊欄觸發) 不能指定 fragment，就整頁重跑
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def quiz_body(deck, progress, scheduler, today, settings):
+    weighting, hard_distractors, auto_grade = settings
+    df = deck.content
+    sync_remote(deck, progress, scheduler)
+
+    # --- A. 選題階段 ---
+    if st.session_state.current_idx is None and st.session_state.stage == 'quiz' and 'study_session' in st.session_state:
+        # 題組模式：直接拿計畫好的下一題，不用再選題 / 出選項
+        session = st.session_state.study_session
+        idx, q = session.next_card()
+        if idx is None:
+            finished = finish_session(progress)
+            # 整個 app 重跑一次，側邊欄的題組進度才會更新
+            st.session_state.session_done = f"📚 題組完成：答對 {finished.correct_count(today)}/{len(finished.results)}"
+            st.rerun()
+        else:
+            st.session_state.current_idx = idx
+            st.session_state.quiz_data = q
+            st.session_state.mode_status = session.status_text()
+            if q['tts_text'] in session.audio:
+                st.session_state.audio_future = (idx, session.audio[q['tts_text']])
+
+    if st.session_state.current_idx is None and st.session_state.stage == 'quiz':
+        # 選卡 + 出題算同一筆 "select"
+        with timed("select"):
+            idx, st.session_state.mode_status = choose_next_card(scheduler, exclude=st.session_state.last_idx)
+            if idx is not None:
+                st.session_state.current_idx = idx
+                st.session_state.quiz_data = build_quiz_data(df, idx, progress[idx, 'Times'], hard_distractors)
+
+        if idx is None:
+            st.warning("資料庫空的，請檢查 Google Sheet。")
+            return
+
+    # --- B. 顯示階段 ---
+    if st.session_state.current_idx is not None:
+        idx = st.session_state.current_idx
+        q = st.session_state.quiz_data
+        mode = q['mode']
     
-    audio_bytes = asyncio.run(generate_audio(q['tts_text']))
+        with timed("audio"):
+            audio_bytes = card_audio(idx, q['tts_text'])
 
-    status_class = "status-due" if "複習" in st.session_state.mode_status else "status-free"
-    st.markdown(f'<div style="text-align:center;"><span class="status-badge {status_class}">{st.session_state.mode_status}</span></div>', unsafe_allow_html=True)
-    st.markdown(f'<div style="text-align:center;"><span class="tag-badge">{row["Category"]} | Lv.{row["Times"]}</span></div>', unsafe_allow_html=True)
+        # 趁使用者作答時準備下一題；作答改變了佇列就重新準備
+        prefetch_settings = (weighting, hard_distractors)
+        if 'study_session' not in st.session_state and not prefetch_is_valid(st.session_state.get('prefetch'), df, scheduler, idx, prefetch_settings):
+            with timed("prefetch"):
+                start_prefetch(df, progress, scheduler, idx, prefetch_settings)
 
-    if st.session_state.stage == 'quiz':
+        if st.session_state.get('card_shown_at', (None,))[0] != idx:
+            st.session_state.card_shown_at = (idx, time.time())  # 算作答花了多久
+
+        status_class = "status-due" if "複習" in st.session_state.mode_status else "status-free"
+        st.markdown(f'<div style="text-align:center;"><span class="status-badge {status_class}">{st.session_state.mode_status}</span></div>', unsafe_allow_html=True)
+        st.markdown(f'<div style="text-align:center;"><span class="tag-badge">{q["category"]} | Lv.{progress[idx, "Times"]}</span></div>', unsafe_allow_html=True)
+
+        if st.session_state.stage == 'quiz':
         
-        # === ✍️ 手寫模式 UI ===
-        if 'writing' in mode:
-            st.subheader("✍️ 手寫黑板挑戰 (自我對答)")
+            # === ✍️ 手寫模式 UI ===
+            if 'writing' in mode:
+                st.subheader("✍️ 手寫黑板挑戰" + ("" if auto_grade else " (自我對答)"))
             
-            if mode == 'char_writing_blind':
-                st.markdown("### 請在黑板上默寫出以下字母：")
-                st.markdown(f'<div class="pron-text">{q["pronunciation"]} ({q["meaning"]})</div>', unsafe_allow_html=True)
-                st.audio(audio_bytes, format='audio/mpeg', autoplay=True) 
-            else:
-                st.markdown("### 請照著寫出以下泰文（注意細節）：")
-                st.markdown(f'<div class="thai-big">{q["thai"]}</div>', unsafe_allow_html=True)
-                st.markdown(f'<div class="meaning-text">{q["meaning"]}</div>', unsafe_allow_html=True)
-
-            canvas_result = st_canvas(
-                fill_color="rgba(255, 165, 0, 0.3)", 
-                stroke_width=6,                       
-                stroke_color="#FFFFFF",               
-                background_color="#2c3e50",           
-                height=300,                           
-                width=700,                            
-                drawing_mode="freedraw",
-                key=f"canvas_{idx}",
-            )
+                if mode == 'char_writing_blind':
+                    st.markdown("### 請在黑板上默寫出以下字母：")
+                    st.markdown(f'<div class="pron-text">{q["pronunciation"]} ({q["meaning"]})</div>', unsafe_allow_html=True)
+                    st.audio(audio_bytes, format='audio/mpeg', autoplay=True) 
+                else:
+                    st.markdown("### 請照著寫出以下泰文（注意細節）：")
+                    st.markdown(f'<div class="thai-big">{q["thai"]}</div>', unsafe_allow_html=True)
+                    st.markdown(f'<div class="meaning-text">{q["meaning"]}</div>', unsafe_allow_html=True)
+
+                with timed("canvas"):
+                    canvas_result = st_canvas(
+                        fill_color="rgba(255, 165, 0, 0.3)", 
+                        stroke_width=6,                       
+                        stroke_color="#FFFFFF",               
+                        background_color="#2c3e50",           
+                        height=300,                           
+                        width=700,                            
+                        drawing_mode="freedraw",
+                        key=f"canvas_{idx}",
+                    )
             
-            if not st.session_state.show_answer:
-                st.caption("🖌️ 寫錯了可以使用左下角的橡皮擦或垃圾桶清空重來喔！")
-                if st.button("👀 寫好了！看答案", use_container_width=True):
-                    st.session_state.show_answer = True
-                    st.rerun()
-            else:
-                st.markdown("---")
-                st.markdown("### 🔍 標準答案在此，你寫對了嗎？")
-                st.markdown(f'<div class="thai-huge" style="color:#27ae60;">{q["thai"]}</div>', unsafe_allow_html=True)
-                
-                col1, col2 = st.columns(2)
+                if not st.session_state.show_answer:
+                    st.caption("🖌️ 寫錯了可以使用左下角的橡皮擦或垃圾桶清空重來喔！")
+                    if st.button("👀 寫好了！看答案", use_container_width=True):
+                        # 自動評分只是建議：跟標準答案一起秀出來，還是由使用者按 ✅ / ❌ 決定 (判錯了可以改)
+                        with timed("handwriting"):
+                            grade = score_handwriting(canvas_result.image_data, q['thai']) if auto_grade else None
+                        st.session_state.handwriting_grade = (idx, grade)
+                        st.session_state.show_answer = True
+                        rerun_panel()
+                else:
+                    st.markdown("---")
+                    st.markdown("### 🔍 標準答案在此，你寫對了嗎？")
+                    st.markdown(f'<div class="thai-huge" style="color:#27ae60;">{q["thai"]}</div>', unsafe_allow_html=True)
+
+                    graded_idx, grade = st.session_state.get('handwriting_grade', (None, None))
+                    grade = grade if graded_idx == idx else None
+                    extra = {}
+                    if grade is not None:
+                        # 沒有字型或畫布是空的就沒有分數，照舊自己對答案
+                        verdict = "看起來寫對了" if grade['is_correct'] else "好像有地方不一樣"
+                        st.info(f"🤖 自動評分：{grade['score']} 分，{verdict}。判斷錯了就按另一個按鈕。")
+                        extra = {'score': grade['score']}
+                    suggest_correct = grade is None or grade['is_correct']
+
+                    col1, col2 = st.columns(2)
                 
-                if col1.button("✅ 對了！", type="primary", use_container_width=True):
-                    st.session_state.result_info = {'is_correct': True, 'user_input': 'ถูกต้อง'}
-                    current_times = int(df.at[idx, 'Times'])
-                    df.at[idx, 'Times'] = current_times + 1
-                    df.at[idx, 'Next'] = today + timedelta(days=current_times+1)
-                    save_data(df)
-                    st.session_state.show_answer = False
-                    st.session_state.stage = 'result'
-                    st.rerun()
+                    if col1.button("✅ 對了！", type="primary" if suggest_correct else "secondary", use_container_width=True):
+                        st.session_state.result_info = {'is_correct': True, 'user_input': 'ถูกต้อง', **extra}
+                        progress[idx, 'Times'], progress[idx, 'Next'] = review_outcome(int(progress[idx, 'Times']), True, mode, today)
+                        record_review(progress, idx)
+                        st.session_state.show_answer = False
+                        st.session_state.stage = 'result'
+                        rerun_panel()
                     
-                if col2.button("❌ 錯了...", use_container_width=True):
-                    st.session_state.result_info = {'is_correct': False, 'user_input': 'ความผิดพลาด'}
-                    df.at[idx, 'Times'] -= 1
-                    df.at[idx, 'Next'] = today
-                    save_data(df)
-                    st.session_state.show_answer = False
-                    st.session_state.stage = 'result'
-                    st.rerun()
-
-        # === ⌨️ 聽寫挑戰 ===
-        elif 'typing' in mode:
-            st.subheader("⌨️ 聽寫挑戰")
-            st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
+                    if col2.button("❌ 錯了...", type="secondary" if suggest_correct else "primary", use_container_width=True):
+                        st.session_state.result_info = {'is_correct': False, 'user_input': 'ความผิดพลาด', **extra}
+                        progress[idx, 'Times'], progress[idx, 'Next'] = review_outcome(int(progress[idx, 'Times']), False, mode, today)
+                        record_review(progress, idx)
+                        st.session_state.show_answer = False
+                        st.session_state.stage = 'result'
+                        rerun_panel()
+
+            # === ⌨️ 聽寫挑戰 ===
+            elif 'typing' in mode:
+                st.subheader("⌨️ 聽寫挑戰")
+                st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
             
-            with st.form(key='typing_form'):
-                user_input = st.text_input("請輸入泰文...", key="thai_input")
-                submit_btn = st.form_submit_button("送出答案", use_container_width=True)
+                with st.form(key='typing_form'):
+                    user_input = st.text_input("請輸入泰文...", key="thai_input")
+                    submit_btn = st.form_submit_button("送出答案", use_container_width=True)
             
-            if submit_btn:
-                is_correct = (user_input.strip() == q['thai'].strip())
-                st.session_state.result_info = {'is_correct': is_correct, 'user_input': user_input}
+                if submit_btn:
+                    is_correct = (user_input.strip() == q['thai'].strip())
+                    st.session_state.result_info = {'is_correct': is_correct, 'user_input': user_input}
                 
-                if is_correct:
-                    current_times = int(df.at[idx, 'Times'])
-                    df.at[idx, 'Times'] = current_times + 1
-                    df.at[idx, 'Next'] = today + timedelta(days=current_times * 2 + 1)
-                else:
-                    df.at[idx, 'Times'] = current_times
-                    df.at[idx, 'Next'] = today
-                
-                save_data(df)
-                st.session_state.stage = 'result'
-                st.rerun()
+                    progress[idx, 'Times'], progress[idx, 'Next'] = review_outcome(int(progress[idx, 'Times']), is_correct, mode, today)
+                    record_review(progress, idx)
+                    st.session_state.stage = 'result'
+                    rerun_panel()
 
-        # === 🎙️ Speaking Challenge ===
-        elif 'speaking' in mode:
-            st.subheader("🎙️ Speaking Challenge")
+            # === 🎙️ Speaking Challenge ===
+            elif 'speaking' in mode:
+                st.subheader("🎙️ Speaking Challenge")
             
-            if mode == 'speaking_thai_show': 
-                st.markdown(f'<div class="thai-huge">{q["thai"]}</div>', unsafe_allow_html=True)
-                with st.expander("💡 提示"): st.write(f"{q['pronunciation']} ({q['meaning']})")
+                if mode == 'speaking_thai_show': 
+                    st.markdown(f'<div class="thai-huge">{q["thai"]}</div>', unsafe_allow_html=True)
+                    with st.expander("💡 提示"): st.write(f"{q['pronunciation']} ({q['meaning']})")
                     
-            elif mode == 'speaking_sentence_text': 
-                st.markdown(f'<div class="thai-big">{q["thai"]}</div>', unsafe_allow_html=True)
-                st.markdown(f'<div class="meaning-text">{q["meaning"]}</div>', unsafe_allow_html=True)
+                elif mode == 'speaking_sentence_text': 
+                    st.markdown(f'<div class="thai-big">{q["thai"]}</div>', unsafe_allow_html=True)
+                    st.markdown(f'<div class="meaning-text">{q["meaning"]}</div>', unsafe_allow_html=True)
                 
-            elif mode == 'speaking_sentence_shadowing': 
-                st.markdown("### 🎧 Listen & Repeat")
-                st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
-                st.caption("請聽音檔，然後唸出來")
+                elif mode == 'speaking_sentence_shadowing': 
+                    st.markdown("### 🎧 Listen & Repeat")
+                    st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
+                    st.caption("請聽音檔，然後唸出來")
 
-            st.markdown("---")
-            text = speech_to_text(language='th', start_prompt="🔴 錄音", stop_prompt="⏹️ 停止", just_once=True, key=f'STT_{idx}')
+                st.markdown("---")
+                text = speech_to_text(language='th', start_prompt="🔴 錄音", stop_prompt="⏹️ 停止", just_once=True, key=f'STT_{idx}')
             
-            if text:
-                target = str(q['tts_text']).strip()
-                score = fuzz.ratio(text, target)
-                pass_score = 70 if row['Category'] == 'Sentence' else 80
-                is_correct = (score >= pass_score)
-                
-                st.session_state.result_info = {'is_correct': is_correct, 'user_input': text, 'score': score}
+                if text:
+                    target = str(q['tts_text']).strip()
+                    cached = deck.speech_targets.get(idx)
+                    with timed("speech_score"):
+                        graded = score_speech(text, target, q['category'],
+                                              prepared=cached[1] if cached and cached[0] == target else None)
+                    is_correct = graded['is_correct']
                 
-                if is_correct:
-                    current_times = int(df.at[idx, 'Times'])
-                    df.at[idx, 'Times'] = current_times + 1
-                    df.at[idx, 'Next'] = today + timedelta(days=current_times * 2 + 1)
-                else:
-                    df.at[idx, 'Times'] -= 1
-                    df.at[idx, 'Next'] = today
+                    st.session_state.result_info = {'is_correct': is_correct, 'user_input': text, 'score': graded['score'],
+                                                    'segments': graded['segments'], 'tone_errors': graded['tone_errors']}
                 
-                save_data(df)
-                st.session_state.stage = 'result'
-                st.rerun()
-
-        # === 選擇題模式 ===
-        else:
-            if mode == 'char_pron_to_thai':
-                st.markdown("### 請選出對應的泰文")
-                st.markdown(f'<div class="pron-text">{q["pronunciation"]}</div>', unsafe_allow_html=True)
-            elif mode == 'char_thai_to_meaning':
-                st.markdown("### 這個字是什麼意思？")
-                st.markdown(f'<div class="thai-huge">{q["thai"]}</div>', unsafe_allow_html=True)
-            elif mode == 'word_thai_to_meaning':
-                st.markdown("### 這個單字的意思是？")
-                st.markdown(f'<div class="thai-big">{q["thai"]}</div>', unsafe_allow_html=True)
-            elif mode == 'word_listen_to_thai':
-                st.markdown("### 🎧 聽到的是哪個字？")
-                st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
-            elif mode == 'sentence_listen_to_meaning':
-                st.markdown("### 🎧 這句話是什麼意思？")
-                st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
+                    progress[idx, 'Times'], progress[idx, 'Next'] = review_outcome(int(progress[idx, 'Times']), is_correct, mode, today)
+                    record_review(progress, idx)
+                    st.session_state.stage = 'result'
+                    rerun_panel()
 
-            st.write("")
-            cols = st.columns(2)
-            for i, opt in enumerate(q['options']):
-                raw_label = opt['Thai'] if mode in ['char_pron_to_thai', 'word_listen_to_thai'] else opt['Meaning']
+            # === 選擇題模式 ===
+            else:
+                if mode == 'char_pron_to_thai':
+                    st.markdown("### 請選出對應的泰文")
+                    st.markdown(f'<div class="pron-text">{q["pronunciation"]}</div>', unsafe_allow_html=True)
+                elif mode == 'char_thai_to_meaning':
+                    st.markdown("### 這個字是什麼意思？")
+                    st.markdown(f'<div class="thai-huge">{q["thai"]}</div>', unsafe_allow_html=True)
+                elif mode == 'word_thai_to_meaning':
+                    st.markdown("### 這個單字的意思是？")
+                    st.markdown(f'<div class="thai-big">{q["thai"]}</div>', unsafe_allow_html=True)
+                elif mode == 'word_listen_to_thai':
+                    st.markdown("### 🎧 聽到的是哪個字？")
+                    st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
+                elif mode == 'sentence_listen_to_meaning':
+                    st.markdown("### 🎧 這句話是什麼意思？")
+                    st.audio(audio_bytes, format='audio/mpeg', autoplay=True)
+
+                st.write("")
+                cols = st.columns(2)
+                for i, opt in enumerate(q['options']):
+                    raw_label = opt['Thai'] if mode in ['char_pron_to_thai', 'word_listen_to_thai'] else opt['Meaning']
                 
-                # --- 修正 2：確保按鈕標籤絕對是字串格式 ---
-                label = str(raw_label).strip() if str(raw_label).strip() else "(未填寫)"
+                    # --- 修正 2：確保按鈕標籤絕對是字串格式 ---
+                    label = str(raw_label).strip() if str(raw_label).strip() else "(未填寫)"
                 
-                # 選項按鈕
-                if cols[i%2].button(label, key=f"btn_{i}", use_container_width=True):
-                    is_correct = (opt['Thai'] == q['thai'])
-                    st.session_state.result_info = {'is_correct': is_correct}
-                    
-                    if is_correct:
-                        current_times = int(df.at[idx, 'Times'])
-                        df.at[idx, 'Times'] = current_times + 1
-                        df.at[idx, 'Next'] = today + timedelta(days=current_times * 2 + 1)
-                    else:
-                        df.at[idx, 'Times'] -= 1
-                        df.at[idx, 'Next'] = today
+                    # 選項按鈕
+                    if cols[i%2].button(label, key=f"btn_{i}", use_container_width=True):
+                        is_correct = (opt['Thai'] == q['thai'])
+                        st.session_state.result_info = {'is_correct': is_correct}
                     
-                    save_data(df)
-                    st.session_state.stage = 'result'
-                    st.rerun()
-
-    # ========================================================
-    #  PART 2: 結果與檢討區 (Result Stage)
-    # ========================================================
-    elif st.session_state.stage == 'result':
-        res = st.session_state.result_info
+                        progress[idx, 'Times'], progress[idx, 'Next'] = review_outcome(int(progress[idx, 'Times']), is_correct, mode, today)
+                        record_review(progress, idx)
+                        st.session_state.stage = 'result'
+                        rerun_panel()
+
+        # ========================================================
+        #  PART 2: 結果與檢討區 (Result Stage)
+        # ========================================================
+        elif st.session_state.stage == 'result':
+            res = st.session_state.result_info
         
-        if 'shadowing' in mode or 'listening_typing' in mode or 'writing' in mode:
-            st.markdown(f'<div class="thai-huge">{q["thai"]}</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="meaning-text">{q["meaning"]}</div>', unsafe_allow_html=True)
-
-        if res['is_correct']:
-            st.markdown(f"""
-            <div class="result-correct">
-                <h2>✅ 答對了！</h2>
-                <div class="thai-big">{q['thai']}</div>
-                <p>{q['meaning']} | {q['pronunciation']}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-            <div class="result-wrong">
-                <h2>❌ 答錯了...</h2>
-                <div class="thai-big">{q['thai']}</div>
-                <p>{q['meaning']} | {q['pronunciation']}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        if 'score' in res and 'writing' not in mode: 
-            st.caption(f"發音/拼字相似度分數: {res['score']}")
+            if 'shadowing' in mode or 'listening_typing' in mode or 'writing' in mode:
+                st.markdown(f'<div class="thai-huge">{q["thai"]}</div>', unsafe_allow_html=True)
+                st.markdown(f'<div class="meaning-text">{q["meaning"]}</div>', unsafe_allow_html=True)
 
-        if 'user_input' in res: 
-            # 如果輸入的是泰文，也一併放大顯示
-            st.markdown(f"<p>你的輸入/狀態:</p><div class='thai-big' style='font-size: 40px !important;'>{res['user_input']}</div>", unsafe_allow_html=True)
+            if res['is_correct']:
+                st.markdown(f"""
+                <div class="result-correct">
+                    <h2>✅ 答對了！</h2>
+                    <div class="thai-big">{q['thai']}</div>
+                    <p>{q['meaning']} | {q['pronunciation']}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.markdown(f"""
+                <div class="result-wrong">
+                    <h2>❌ 答錯了...</h2>
+                    <div class="thai-big">{q['thai']}</div>
+                    <p>{q['meaning']} | {q['pronunciation']}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            if 'score' in res and 'writing' not in mode: 
+                st.caption(f"發音/拼字相似度分數: {res['score']}")
+                if res.get('segments'):
+                    # 每個詞的對齊分數：漏唸的標紅、唸得不完整的標橘
+                    words = []
+                    for word, seg_score in res['segments']:
+                        color = "#27ae60" if seg_score >= 80 else "#e67e22" if seg_score >= MISSED_BELOW else "#c0392b; text-decoration: line-through"
+                        words.append(f'<span style="color:{color};">{word}</span>')
+                    st.markdown(f'<div class="thai-big">{" ".join(words)}</div>', unsafe_allow_html=True)
+                    if res.get('tone_errors'):
+                        st.caption(f"🎵 聲調不對的音節：{res['tone_errors']} 個")
+            elif 'score' in res:
+                st.caption(f"🤖 手寫相似度分數: {res['score']}")
+
+            if 'user_input' in res: 
+                # 如果輸入的是泰文，也一併放大顯示
+                st.markdown(f"<p>你的輸入/狀態:</p><div class='thai-big' style='font-size: 40px !important;'>{res['user_input']}</div>", unsafe_allow_html=True)
             
-        st.write("🔊 聽聽看標準發音：")
-        st.audio(audio_bytes, format='audio/mpeg')
+            st.write("🔊 聽聽看標準發音：")
+            st.audio(audio_bytes, format='audio/mpeg')
 
-        st.write("")
-        if st.button("➡️ 下一題", type="primary", use_container_width=True):
-            st.session_state.last_idx = idx
-            st.session_state.current_idx = None
-            st.session_state.stage = 'quiz'
-            st.session_state.result_info = {}
-            st.session_state.show_answer = False # 重置解答狀態
-            st.rerun()
\ No newline at end of file
+            st.write("")
+            if st.button("➡️ 下一題", type="primary", use_container_width=True):
+                st.session_state.last_idx = idx
+                st.session_state.current_idx = None
+                pf = st.session_state.pop('prefetch', None)
+                if 'study_session' not in st.session_state and prefetch_is_valid(pf, df, scheduler, idx, prefetch_settings):
+                    # 直接換上準備好的下一題
+                    st.session_state.current_idx = pf['idx']
+                    st.session_state.quiz_data = pf['quiz_data']
+                    st.session_state.audio_future = (pf['idx'], pf['audio'])
+                    st.session_state.mode_status = mode_status_text(scheduler)
+                st.session_state.stage = 'quiz'
+                st.session_state.result_info = {}
+                st.session_state.show_answer = False # 重置解答狀態
+                rerun_panel()
+
+@st.fragment
+def quiz_panel(deck, progress, scheduler, today, settings):
+    # 整頁的 begin_rerun / end_rerun 不會在 fragment 自己重跑時執行，答題區另外記 "fragment"
+    perf = get_perf()
+    begin_rerun(perf, st.session_state.perf, stage="fragment")
+    try:
+        quiz_body(deck, progress, scheduler, today, settings)
+        panel_status()
+    finally:
+        end_rerun(perf, st.session_state.perf, stage="fragment")
+
+def panel_status():
+    # 會隨作答改變的狀態放在答題區裡，不放側邊欄 (側邊欄只有整頁重跑才會更新)
+    session = st.session_state.get('study_session')
+    if session is not None:
+        answered = len(session.results)
+        st.progress(answered / max(len(session), 1), text=f"📚 題組 {answered}/{len(session)}")
+    sync_stats = get_review_journal().stats()
+    if sync_stats['pending_rows']:
+        st.caption(f"⏳ 待同步 {sync_stats['pending_rows']} 筆作答")
+    if sync_stats['last_error']:
+        st.caption(f"⚠️ 同步失敗，稍後重試：{sync_stats['last_error']}")
+    if 'sync_note' in st.session_state:
+        st.caption(st.session_state.pop('sync_note'))
+
+quiz_panel(deck, progress, scheduler, today, (weighting, hard_distractors, auto_grade))
+
+end_rerun(get_perf(), st.session_state.perf, profile_dir=PROFILE_DIR)
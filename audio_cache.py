@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# ==========================================
+# TTS 音檔快取 (記憶體 LRU + 硬碟)
+# ==========================================
+# 同一張卡片在 Streamlit 每次 rerun 都會重新呼叫 TTS，
+# 這裡把音檔依 hash(voice, text) 存起來，重複的題目直接讀本地 bytes。
+
+DEFAULT_VOICE = "th-TH-PremwadeeNeural"
+
+
+class EdgeTTSBackend:
+    """真正的 edge_tts 後端 (需要網路)。"""
+
+    name = "edge"
+
+    async def synthesize(self, text, voice):
+        import edge_tts
+
+        communicate = edge_tts.Communicate(text, voice)
+        chunks = []  # 先收集再一次 join，避免 bytes += 變成 O(n^2)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        return b"".join(chunks)
+
+
+class FakeTTSBackend:
+    """測試用的假後端：不連網，回傳可預期的 bytes 並記錄呼叫次數。"""
+
+    name = "fake"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def synthesize(self, text, voice):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return b"FAKE-MP3:" + hashlib.sha1(f"{voice}\n{text}".encode("utf-8")).digest() + text.encode("utf-8")
+
+
+def make_backend(name=None):
+    name = (name or os.environ.get("THAI_TTS_BACKEND", "edge")).lower()
+    if name == "fake":
+        return FakeTTSBackend()
+    return EdgeTTSBackend()
+
+
+def audio_key(text, voice=DEFAULT_VOICE):
+    return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, backend=None, cache_dir=None, max_memory_bytes=32 * 1024 * 1024,
+                 max_disk_bytes=2048 * 1024 * 1024, voice=DEFAULT_VOICE):
+        self.backend = backend or make_backend()
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.voice = voice
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    # --- 記憶體層 ---
+    def _memory_get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def _memory_put(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    # --- 硬碟層 ---
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".mp3")
+
+    def _disk_get(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # 更新時間，讓淘汰時依「最近使用」排序
+        except OSError:
+            pass
+        return data
+
+    def _disk_put(self, key, data):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            old_size = os.path.getsize(path)  # 同一個 key 已經有檔案：覆蓋掉，只算大小差
+        except OSError:
+            old_size = 0
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data) - old_size
+        self._evict_disk()
+
+    def _scan_disk(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def _evict_disk(self):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            entries = sorted(self._scan_disk())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._disk_bytes = total
+
+    # --- 對外介面 ---
+    def contains(self, text, voice=None):
+        key = audio_key(text, voice or self.voice)
+        if self._memory_get(key) is not None:
+            return True
+        return bool(self.cache_dir) and os.path.exists(self._path(key))
+
+    def get_cached(self, text, voice=None):
+        """只查快取，不呼叫 TTS。找不到回傳 None。"""
+        key = audio_key(text, voice or self.voice)
+        data = self._memory_get(key)
+        if data is not None:
+            self.memory_hits += 1
+            return data
+        data = self._disk_get(key)
+        if data is not None:
+            self.disk_hits += 1
+            self._memory_put(key, data)
+            return data
+        return None
+
+    async def get(self, text, voice=None, keep_in_memory=True):
+        voice = voice or self.voice
+        data = self.get_cached(text, voice)
+        if data is not None:
+            return data
+
+        self.misses += 1
+        try:
+            data = await self.backend.synthesize(text, voice)
+        except Exception:
+            self.errors += 1
+            return b""
+        if not data:
+            # 空結果不快取，下次再試
+            return b""
+
+        key = audio_key(text, voice)
+        if keep_in_memory:
+            self._memory_put(key, data)
+        try:
+            self._disk_put(key, data)
+        except OSError:
+            self.errors += 1
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+# ==========================================
+# 整副牌的音檔預先下載
+# ==========================================
+def deck_tts_texts(df):
+    # 跟出題時一樣：有 TTS_Text 就唸 TTS_Text，沒有就唸 Thai
+    tts = df['TTS_Text'].fillna("").astype(str)
+    return tts.where(tts.str.strip() != "", df['Thai']).tolist()
+
+
+async def prewarm(cache, texts, concurrency=8, retries=3, progress=None):
+    # 已經在硬碟上的直接略過，所以中斷後再跑一次就是從斷點繼續
+    todo = [t for t in dict.fromkeys(texts) if t and not cache.contains(t)]
+    total = len(todo)
+    done = 0
+    failed = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        nonlocal done
+        async with semaphore:
+            ok = False
+            for attempt in range(retries + 1):
+                if await cache.get(text, keep_in_memory=False):
+                    ok = True
+                    break
+                if attempt < retries:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+        done += 1
+        if not ok:
+            failed.append(text)
+        if progress is not None:
+            progress(done, total, len(failed))
+
+    if progress is not None:
+        progress(0, total, 0)
+    await asyncio.gather(*(one(t) for t in todo))
+    return {"total": total, "synthesized": total - len(failed), "failed": failed}
+
+
+def synthesize_batch(cache, texts, executor, concurrency=8):
+    # 題組一開始就把所有音檔丟到背景一起合成；每個文字一個 Future，先做完的題目先能播
+    futures = {t: Future() for t in dict.fromkeys(texts) if t}
+
+    async def one(text, semaphore):
+        async with semaphore:
+            try:
+                futures[text].set_result(await cache.get(text))
+            except Exception:
+                futures[text].set_result(b"")
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(one(t, semaphore) for t in futures))
+
+    if futures:
+        executor.submit(asyncio.run, run())
+    return futures
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from collections import defaultdict
+from unittest import mock
+
+import numpy as np
+
+# ==========================================
+# Headless benchmark：用 Streamlit AppTest 跑完整的答題流程
+#   python bench/bench_quiz.py --sizes 100 10000 100000 --cards 30 --out bench_results.json
+# ==========================================
+# Google Sheet、TTS、語音辨識、手寫畫布都換成假的，
+# 量每次 rerun 的延遲、每題寫出的 bytes、每張卡的 TTS 呼叫次數、記憶體高峰。
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import audio_cache  # noqa: E402
+from bench import fakes  # noqa: E402
+
+MC_MODES = ['char_pron_to_thai', 'char_thai_to_meaning', 'word_thai_to_meaning', 'word_listen_to_thai', 'sentence_listen_to_meaning']
+
+
+def install_fake_components():
+    # 前端元件在 headless 環境沒辦法跑，換成可以腳本控制的假模組
+    mic = types.ModuleType("streamlit_mic_recorder")
+    mic.speech_to_text = fakes.fake_speech_to_text
+    canvas = types.ModuleType("streamlit_drawable_canvas")
+    canvas.st_canvas = fakes.fake_st_canvas
+    sys.modules["streamlit_mic_recorder"] = mic
+    sys.modules["streamlit_drawable_canvas"] = canvas
+
+
+def find_button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"找不到按鈕：{label}")
+
+
+def timed_run(at, samples, action):
+    start = time.perf_counter()
+    at.run()
+    samples[action].append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"{action}: {at.exception[0].message}")
+
+
+def answer_card(at, rng, accuracy, samples):
+    q = at.session_state['quiz_data']
+    mode = q['mode']
+    correct = rng.random() < accuracy
+
+    if mode in MC_MODES:
+        options = q['options']
+        right = [i for i, opt in enumerate(options) if opt['Thai'] == q['thai']]
+        wrong = [i for i, opt in enumerate(options) if opt['Thai'] != q['thai']]
+        i = right[0] if correct or not wrong else rng.choice(wrong)
+        at.button(key=f"btn_{i}").click()
+    elif 'typing' in mode:
+        at.text_input(key="thai_input").input(q['thai'] if correct else q['thai'] + "ก")
+        find_button(at, "送出答案").click()
+    elif 'writing' in mode:
+        find_button(at, "👀 寫好了！看答案").click()
+        timed_run(at, samples, "reveal")
+        find_button(at, "✅ 對了！" if correct else "❌ 錯了...").click()
+    elif 'speaking' in mode:
+        fakes.STT_REPLY["text"] = q['tts_text'] if correct else "ไม่ใช่"
+    timed_run(at, samples, f"answer:{mode}")
+    return mode
+
+
+def summarize(values):
+    values = np.asarray(values) * 1000
+    return {
+        "count": int(len(values)),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def run_session(size, cards, accuracy, seed, trace_memory):
+    fakes.SHEET = fakes.FakeSheet(fakes.make_deck(size, seed))
+    tts = audio_cache.FakeTTSBackend()
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    rng = random.Random(seed)
+    samples = defaultdict(list)
+    modes = defaultdict(int)
+    error = None
+
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            mock.patch.dict(os.environ, {"THAI_CACHE_DIR": cache_dir, "THAI_STORAGE": "gsheets"}), \
+            mock.patch("streamlit_gsheets.GSheetsConnection", fakes.FakeGSheetsConnection), \
+            mock.patch("gspread.service_account_from_dict", lambda info: fakes.FakeGspreadClient()), \
+            mock.patch("audio_cache.make_backend", lambda name=None: tts):
+        if trace_memory:
+            tracemalloc.start()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        at = AppTest.from_file(os.path.join(ROOT, "Thai.py"), default_timeout=600)
+        at.secrets["connections"] = {"gsheets": fakes.FAKE_SETTINGS}
+        played = 0
+        try:
+            timed_run(at, samples, "cold_start")
+            # 擁有者模式：作答才會寫回 (假的) Sheet，寫出量才量得到
+            at.toggle(key="owner_mode").set_value(True)
+            timed_run(at, samples, "owner_mode")
+            for _ in range(cards):
+                modes[answer_card(at, rng, accuracy, samples)] += 1
+                played += 1
+                find_button(at, "➡️ 下一題").click()
+                timed_run(at, samples, "next")
+            # Reload 會先把 write-behind journal 送完，寫出量才算得準
+            find_button(at, "🔄 Reload Data").click()
+            timed_run(at, samples, "reload")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        rss_growth_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    answers = [v for k, vs in samples.items() if k.startswith("answer:") for v in vs]
+    return {
+        "deck_size": size,
+        "cards_played": played,
+        "error": error,
+        "modes": dict(modes),
+        "rerun_latency": {action: summarize(vs) for action, vs in sorted(samples.items())},
+        "answer_latency": summarize(answers) if answers else None,
+        "bytes_written_per_answer": round(fakes.SHEET.bytes_written / played, 1) if played else None,
+        "sheet_full_writes": fakes.SHEET.full_writes,
+        "sheet_cell_writes": fakes.SHEET.cell_writes,
+        "sheet_reads": fakes.SHEET.reads,
+        "tts_calls_per_card": round(tts.calls / (played + 1), 3),
+        "peak_traced_bytes": peak,
+        "max_rss_growth_kb": rss_growth_kb,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thai.py 答題流程 benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--cards", type=int, default=30)
+    parser.add_argument("--accuracy", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="用 tracemalloc 量記憶體高峰 (會讓延遲變慢)")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    install_fake_components()
+    results = []
+    for size in args.sizes:
+        print(f"▶ deck={size} cards={args.cards}", flush=True)
+        result = run_session(size, args.cards, args.accuracy, args.seed, args.trace_memory)
+        results.append(result)
+        answer = result["answer_latency"] or {}
+        print(f"  answer p50={answer.get('p50_ms')}ms p95={answer.get('p95_ms')}ms "
+              f"bytes/answer={result['bytes_written_per_answer']} tts/card={result['tts_calls_per_card']}"
+              + (f"  ⚠️ {result['error']}" if result['error'] else ""), flush=True)
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "streamlit": st.__version__,
+        "params": vars(args),
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果寫到 {args.out}")
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
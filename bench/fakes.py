@@ -0,0 +1,180 @@
+import json
+import random
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+from streamlit.connections import BaseConnection
+
+# ==========================================
+# Benchmark 用的假元件：Google Sheet、語音辨識、手寫畫布
+# ==========================================
+
+THAI_CONSONANTS = list("กขคฆงจฉชซฌญฎฏฐฑฒณดตถทธนบปผฝพฟภมยรลวศษสหฬอฮ")
+THAI_VOWELS = ["ะ", "า", "ิ", "ี", "ึ", "ื", "ุ", "ู", "เ", "แ", "โ", "ใ", "ไ", ""]
+THAI_TONES = ["่", "้", "๊", "๋", ""]
+
+
+def make_deck(n, seed=0):
+    # 合成牌組：Char / Word / Sentence 大約 1:3:1，Times 0~6、大部分已經到期
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for i in range(n):
+        category = rng.choices(['Char', 'Word', 'Sentence'], weights=[1, 3, 1])[0]
+        if category == 'Char':
+            thai = rng.choice(THAI_CONSONANTS) + (str(i) if i >= len(THAI_CONSONANTS) else "")
+        else:
+            syllables = rng.randint(2, 4) if category == 'Word' else rng.randint(6, 12)
+            thai = "".join(rng.choice(THAI_CONSONANTS) + rng.choice(THAI_VOWELS) + rng.choice(THAI_TONES)
+                           for _ in range(syllables))
+            if category == 'Sentence':
+                thai = " ".join([thai[:len(thai) // 2], thai[len(thai) // 2:]])
+        rows.append({
+            'Thai': thai,
+            'TTS_Text': "",
+            'Pronunciation': f"pron-{i}",
+            'Meaning': f"meaning-{i}",
+            'Category': category,
+            'Times': rng.randint(0, 6),
+            'Next': (today + timedelta(days=rng.randint(-10, 3))).isoformat(),
+        })
+    return pd.DataFrame(rows)
+
+
+class FakeSheet:
+    # 整個 process 共用一張假的 Sheet，順便記錄讀寫量
+    def __init__(self, df):
+        self.df = df.copy()
+        self.revision = 0
+        self.reads = 0
+        self.full_writes = 0
+        self.cell_writes = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def _cells(self, a1):
+        # "C5" 或 "C2:C" / "C2:C101" → [(df 列, df 欄), ...]
+        from gspread.utils import a1_to_rowcol
+
+        first, _, last = a1.partition(":")
+        row, col = a1_to_rowcol(first)
+        if not last:
+            return [(row - 2, col - 1)]
+        end = len(self.df) + 1 if last.isalpha() else a1_to_rowcol(last)[0]
+        return [(r - 2, col - 1) for r in range(row, end + 1)]
+
+    def apply_cells(self, updates):
+        with self._lock:
+            self.bytes_written += len(json.dumps(updates, ensure_ascii=False).encode("utf-8"))
+            for update in updates:
+                values = [v for row in update['values'] for v in row]
+                for (row, col), value in zip(self._cells(update['range']), values):
+                    self.df.iat[row, col] = value
+                    self.cell_writes += 1
+            self.revision += 1
+
+    def add_column(self, name):
+        with self._lock:
+            self.df[name] = pd.Series([""] * len(self.df), index=self.df.index, dtype=object)
+            self.revision += 1
+
+    def cells(self, ranges):
+        # 跟 batch_get 一樣：空的儲存格是 []，欄尾的空白省略
+        with self._lock:
+            out = []
+            for a1 in ranges:
+                rows = []
+                for row, col in self._cells(a1):
+                    value = self.df.iat[row, col] if row < len(self.df) else ""
+                    rows.append([value] if value != "" and not pd.isna(value) else [])
+                while rows and not rows[-1]:
+                    rows.pop()
+                out.append(rows)
+            return out
+
+    def replace(self, data):
+        with self._lock:
+            self.bytes_written += len(data.to_csv(index=False).encode("utf-8"))
+            self.df = data.reset_index(drop=True)
+            self.full_writes += 1
+            self.revision += 1
+
+
+SHEET = None
+
+
+class _FakeWorksheet:
+    def row_values(self, n):
+        return list(SHEET.df.columns)
+
+    @property
+    def col_count(self):
+        return len(SHEET.df.columns)
+
+    def add_cols(self, n):
+        pass  # update_cell 寫標題時才真的加欄
+
+    def update_cell(self, row, col, value):
+        # 只有加 Updated / ID 欄的時候會用到 (寫第 1 列的標題)
+        SHEET.add_column(value)
+
+    def batch_get(self, ranges, **kwargs):
+        return SHEET.cells(ranges)
+
+    def batch_update(self, updates, value_input_option=None):
+        SHEET.apply_cells(updates)
+
+
+class _FakeSpreadsheet:
+    def get_lastUpdateTime(self):
+        return f"rev-{SHEET.revision}"
+
+    def worksheet(self, name):
+        return _FakeWorksheet()
+
+
+class FakeGspreadClient:
+    # 代替 gspread.service_account_from_dict(...) 回傳的 client
+    def open_by_url(self, url):
+        return _FakeSpreadsheet()
+
+    def open(self, title, folder_id=None):
+        return _FakeSpreadsheet()
+
+
+FAKE_SETTINGS = {"type": "service_account", "spreadsheet": "https://docs.google.com/spreadsheets/d/bench"}
+
+
+class FakeGSheetsConnection(BaseConnection):
+    def _connect(self, **kwargs):
+        return FakeGspreadClient()
+
+    @property
+    def client(self):
+        return self._instance
+
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        SHEET.reads += 1
+        return SHEET.df.copy()
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        SHEET.replace(data)
+
+
+# --- 語音辨識：bench 先「錄好」一句話，App 下一次呼叫時拿到 ---
+STT_REPLY = {"text": None}
+
+
+def fake_speech_to_text(*args, **kwargs):
+    text, STT_REPLY["text"] = STT_REPLY["text"], None
+    return text
+
+
+class _CanvasResult:
+    image_data = None
+    json_data = None
+
+
+def fake_st_canvas(*args, **kwargs):
+    return _CanvasResult()
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 沒有 pyarrow 就不做本地快照，每次都讀 Google Sheet
+    pa = None
+    pq = None
+
+# ==========================================
+# 本地牌組快照 (Parquet + 版本標記)
+# ==========================================
+# 清理過的牌組存成 Parquet，旁邊放一個 meta.json 記錄遠端版本 (Sheet 的最後修改時間)。
+# 啟動時只要遠端版本沒變，就直接開本地檔，不用再讀整張表、再清理一次。
+
+
+class DeckSnapshot:
+    def __init__(self, directory):
+        self.directory = directory
+        self.data_path = os.path.join(directory, "deck.parquet")
+        self.meta_path = os.path.join(directory, "deck.meta.json")
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return pq is not None
+
+    def revision(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("revision")
+        except (OSError, ValueError):
+            return None
+
+    def load(self, revision=None):
+        # revision 給 None 代表不檢查版本；版本不符或檔案壞掉都回傳 None
+        if not self.enabled:
+            return None
+        with self._lock:
+            stored = self.revision()
+            if stored is None or (revision is not None and stored != revision):
+                return None
+            try:
+                table = pq.read_table(self.data_path, memory_map=True)
+            except (OSError, pa.ArrowException):
+                return None
+        df = table.to_pandas()
+        df['Next'] = pd.to_datetime(df['Next']).dt.date
+        return df
+
+    def save(self, df, revision):
+        if not self.enabled or df.empty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        out = df.copy()
+        out['Next'] = pd.to_datetime(out['Next'])
+        table = pa.Table.from_pandas(out, preserve_index=True)
+        with self._lock:
+            tmp = self.data_path + ".tmp"
+            pq.write_table(table, tmp)
+            os.replace(tmp, self.data_path)
+            self._write_meta(revision)
+
+    def apply_deltas(self, deltas, revision):
+        # 背景同步成功之後，把同樣的變動套到快照上，下次啟動不用重讀整張表
+        df = self.load()
+        if df is None:
+            return
+        for row, delta in deltas.items():
+            if row in df.index:
+                df.at[row, 'Times'] = delta['Times']
+                df.at[row, 'Next'] = pd.Timestamp(delta['Next']).date()
+                if 'Updated' in delta and 'Updated' in df.columns:
+                    df.at[row, 'Updated'] = delta['Updated']
+        self.save(df, revision)
+
+    def invalidate(self):
+        with self._lock:
+            self._write_meta(None)
+
+    def _write_meta(self, revision):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"revision": revision}, f)
+        os.replace(tmp, self.meta_path)
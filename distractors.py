@@ -0,0 +1,155 @@
+import random
+import threading
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 選擇題干擾選項索引
+# ==========================================
+# 牌組載入時建一次：類別 → 該類別所有列的位置 (numpy 陣列)。
+# 困難模式再用 rapidfuzz 的 process.cdist 預先算好每張卡最像的 top-k 卡片，
+# 出題時只要從 k 個鄰居裡抽，不用再掃整個 DataFrame。
+# 鄰居索引是同類別兩兩比對 (10k 張要 1~2 秒、10 萬張要幾分鐘)，不能在使用者的 rerun 裡建：
+# prepare() 丟到背景執行緒 (整個 process 每個欄位只建一次)，建好之前困難模式先退回同類別隨機。
+
+BLOCK_ROWS = 1024  # cdist 一次算幾列，避免 10 萬列時整個矩陣塞爆記憶體
+
+
+class DistractorIndex:
+    def __init__(self, df, rng=None):
+        self.rng = rng or random.Random()
+        self.labels = df.index.to_numpy()
+        self._pos = {label: i for i, label in enumerate(self.labels)}
+        self.thai = df['Thai'].to_numpy(dtype=object)
+        self.meaning = df['Meaning'].to_numpy(dtype=object)
+        self.thai_codes = df['Thai'].factorize()[0].astype(np.int32)
+
+        codes, categories = df['Category'].factorize()
+        self.category_codes = codes.astype(np.int32)
+        self.categories = list(categories)
+        order = np.argsort(self.category_codes, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(self.category_codes[order], np.arange(len(self.categories) + 1))
+        self.members = {cat: order[bounds[i]:bounds[i + 1]] for i, cat in enumerate(self.categories)}
+
+        self._neighbours = {}  # field -> (k, 每列的鄰居位置陣列，不足補 -1)
+        self._building = {}    # field -> Future；建過 (不管成功與否) 就不會再送
+        self._lock = threading.Lock()
+
+    # --- 一般模式：同類別隨機抽 ---
+    def _random_from_category(self, pos, n, taken=()):
+        members = self.members.get(self.categories[self.category_codes[pos]], np.empty(0, np.int32))
+        own = self.thai_codes[pos]
+        picked = []
+        seen = set(taken)
+        m = len(members)
+        # 先抽一小把再過濾掉同一個泰文 (重複的卡)，不夠才整個類別掃一次
+        for k in self.rng.sample(range(m), min(m, n + len(seen) + 3)):
+            cand = int(members[k])
+            if cand in seen or self.thai_codes[cand] == own:
+                continue
+            picked.append(cand)
+            seen.add(cand)
+            if len(picked) == n:
+                return picked
+        rest = [int(c) for c in members if int(c) not in seen and self.thai_codes[c] != own]
+        self.rng.shuffle(rest)
+        return picked + rest[:n - len(picked)]
+
+    # --- 困難模式：預先算好的相似鄰居 ---
+    def build_neighbours(self, field='Thai', k=8):
+        from rapidfuzz import fuzz, process
+
+        values = self.thai if field == 'Thai' else self.meaning
+        # 意思選項的話，意思一模一樣的卡也排除，不然會有兩個正解
+        same_codes = self.thai_codes if field == 'Thai' else pd.factorize(values)[0].astype(np.int32)
+        out = np.full((len(self.labels), k), -1, dtype=np.int32)
+        for members in self.members.values():
+            choices = [str(v) for v in values[members]]
+            codes = self.thai_codes[members]
+            same = same_codes[members]
+            kk = min(k, len(members) - 1)
+            if kk <= 0:
+                continue
+            for start in range(0, len(members), BLOCK_ROWS):
+                block = slice(start, start + BLOCK_ROWS)
+                scores = process.cdist(choices[block], choices, scorer=fuzz.ratio,
+                                       dtype=np.int16, workers=-1)
+                # 自己、以及同一個泰文的重複卡不能當干擾選項
+                scores[(codes[block, None] == codes[None, :]) | (same[block, None] == same[None, :])] = -1
+                top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                order = np.argsort(-top_scores, axis=1)
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+                result = members[top]
+                result[top_scores < 0] = -1
+                out[members[block], :kk] = result
+        self._neighbours[field] = (k, out)
+        return out
+
+    def prepare(self, executor, fields=('Thai', 'Meaning')):
+        # 背景建困難模式的鄰居索引；可以每次 rerun 都呼叫，已經送出的欄位會略過
+        with self._lock:
+            for field in fields:
+                if field not in self._neighbours and field not in self._building:
+                    self._building[field] = executor.submit(self.build_neighbours, field)
+
+    def ready(self, field='Thai'):
+        return field in self._neighbours
+
+    def pick(self, label, n=3, hard=False, field='Thai'):
+        # 回傳干擾選項的 index label 清單
+        pos = self._pos[label]
+        picked = []
+        built = self._neighbours.get(field) if hard else None
+        if built is not None:
+            _, neighbours = built
+            near = [int(c) for c in neighbours[pos] if c >= 0]
+            picked = self.rng.sample(near, min(n, len(near)))
+        if len(picked) < n:
+            picked += self._random_from_category(pos, n - len(picked), taken=picked)
+        return [self.labels[p] for p in picked]
+
+    def pick_many(self, labels, n=3, hard=False, field='Thai'):
+        # 題組用：一整批卡的干擾選項一次抽完，回傳每張卡的 label 清單
+        pos = np.array([self._pos[label] for label in labels], dtype=np.int64)
+        rng = np.random.default_rng(self.rng.getrandbits(64))
+        out = np.full((len(pos), n), -1, dtype=np.int64)
+
+        built = self._neighbours.get(field) if hard else None
+        if built is not None and len(pos):
+            _, neighbours = built
+            near = neighbours[pos]
+            # 每列隨機排序，空位 (-1) 排到最後，取前 n 個
+            keys = rng.random(near.shape)
+            keys[near < 0] = 2.0
+            order = np.argsort(keys, axis=1)[:, :n]
+            picked = np.take_along_axis(near, order, axis=1)
+            out[:, :picked.shape[1]] = picked
+        else:
+            width = n + 3
+            for code, cat in enumerate(self.categories):
+                members = self.members[cat]
+                rows = np.flatnonzero(self.category_codes[pos] == code)
+                if not len(rows) or not len(members):
+                    continue
+                cand = members[rng.integers(0, len(members), (len(rows), width))].astype(np.int64)
+                own = self.thai_codes[pos[rows]]
+                ok = self.thai_codes[cand] != own[:, None]
+                # 同一列裡抽到重複的，只留第一次
+                dup = (cand[:, :, None] == cand[:, None, :]) & np.tri(width, k=-1, dtype=bool)[None]
+                ok &= ~dup.any(axis=2)
+                order = np.argsort(~ok, axis=1, kind='stable')[:, :n]
+                picked = np.take_along_axis(cand, order, axis=1)
+                picked[~np.take_along_axis(ok, order, axis=1)] = -1
+                out[rows] = picked
+
+        result = []
+        for p, row in zip(pos, out):
+            picked = [int(c) for c in row if c >= 0]
+            if len(picked) < n:
+                # 抽不夠 (類別太小、鄰居不足) 就走單張的補法
+                picked += self._random_from_category(int(p), n - len(picked), taken=picked)
+            result.append([self.labels[c] for c in picked])
+        return result
@@ -0,0 +1,221 @@
+import glob
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# ==========================================
+# 手寫自動評分 (st_canvas 的 image_data vs. 字型畫出來的標準答案)
+# ==========================================
+# 兩邊都先裁到墨水的外框、等比例縮到 GRID x GRID，再細化成一個像素寬的骨架 (筆畫粗細不影響)，
+# 取骨架點算 chamfer 距離 (每一點到對方最近點的距離，兩個方向各取 98 百分位，取大的)。
+# 整個字一起算的話，一個字母寫錯只佔全部點的一小部分，百分位根本看不到 (ABC / ABD 會 100 分)：
+# 所以依字型的字元寬度把標準答案切成一欄一欄 (每個字一欄，上下的母音 / 聲調符號跟著前一個字)，
+# 每欄各自算、取最差的一欄。手寫的歪斜 / 寬窄用幾個小的旋轉 / 縮放去對齊，取最好的那個。
+# 分數只是建議：畫面上還是由使用者按 ✅ / ❌ 決定，比較像的字 (บ/ป、ด/ค) 系統判錯也能改。
+# 標準答案的點陣只畫一次 (lru_cache)，每次評分只處理使用者的畫布。
+# 找不到泰文字型就回傳 None，畫面退回原本的自己對答案。
+
+GRID = 64
+MAX_POINTS = 600       # 點太多就平均抽樣，距離矩陣最多 600 x 600
+PERCENTILE = 98        # 接近 Hausdorff (最大值)，但容得下一兩個雜點
+CHAMFER_FULL = 0.035   # 最差一欄的 chamfer 距離 (以一個字的高度為 1) 在這以下是 100 分
+CHAMFER_ZERO = 0.08    # 到這裡就是 0 分 (O/Q、B/8 這種只差一小筆的大約 0.053~0.082)
+PASS_SCORE = 60
+# 對齊用的小變形：(旋轉角度, 水平斜切)；變形完再把外框對齊標準答案的外框。
+# 一個詞寬好幾個字，歪 2~3 度兩端就差很多，角度要切得細：先用抽樣的點找最好的變形，再用全部的點算一次
+ALIGNMENTS = [(angle, shear) for angle in range(-6, 7) for shear in (-0.15, 0.0, 0.15)]
+SEARCH_POINTS = 200
+SEARCH_KEEP = 3
+MAX_STRETCH = 1.3      # 對齊外框時，水平 / 垂直縮放比例最多差這麼多 (寫得太扁、太瘦還是要扣)
+
+FONT_CANDIDATES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "*.[ot]t[fc]"),
+    "/usr/share/fonts/**/NotoSansThai*.[ot]t[fc]",
+    "/usr/share/fonts/**/NotoSerifThai*.[ot]t[fc]",
+    "/usr/share/fonts/**/tlwg/Garuda*.[ot]t[fc]",
+    "/usr/share/fonts/**/tlwg/Loma*.[ot]t[fc]",
+    "/usr/share/fonts/**/Sarabun*.[ot]t[fc]",
+    "/System/Library/Fonts/**/Thonburi.tt[fc]",
+    "C:/Windows/Fonts/tahoma.ttf",
+]
+
+
+@lru_cache(maxsize=1)
+def find_font():
+    # THAI_FONT_PATH 優先，其次常見的泰文字型位置
+    path = os.environ.get("THAI_FONT_PATH")
+    if path and os.path.exists(path):
+        return path
+    for pattern in FONT_CANDIDATES:
+        found = sorted(glob.glob(pattern, recursive=True))
+        if found:
+            return found[0]
+    return None
+
+
+def normalize(mask, cells=1):
+    # 裁到墨水外框，等比例縮進 GRID 高、GRID x cells 寬的框 (cells = 幾個字)，置中。
+    # 多個字的詞不會被擠進一個正方形，每個字都還有差不多 GRID 的解析度，距離也以「一個字的高度」為單位
+    ys, xs = np.nonzero(mask)
+    if not len(ys):
+        return None
+    crop = mask[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    h, w = crop.shape
+    scale = min(GRID / h, GRID * cells / w)
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    small = np.asarray(Image.fromarray(crop.astype(np.uint8) * 255).resize(size, Image.BOX)) > 40
+    out = np.zeros((GRID, GRID * cells), dtype=bool)
+    top, left = (GRID - size[1]) // 2, (GRID * cells - size[0]) // 2
+    out[top:top + size[1], left:left + size[0]] = small
+    return out
+
+
+def skeleton(grid):
+    # Zhang-Suen 細化，整張 GRID x GRID 一起做 (NumPy)，筆畫變成一個像素寬
+    g = np.pad(grid, 1).astype(np.uint8)
+    while True:
+        changed = False
+        for step in (0, 1):
+            # p2..p9：上、右上、右、右下、下、左下、左、左上
+            p = [np.roll(g, (-dy, -dx), (0, 1)) for dy, dx in
+                 ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))]
+            neighbours = sum(p)
+            transitions = sum((p[i] == 0) & (p[(i + 1) % 8] == 1) for i in range(8))
+            if step == 0:
+                side = (p[0] * p[2] * p[4] == 0) & (p[2] * p[4] * p[6] == 0)
+            else:
+                side = (p[0] * p[2] * p[6] == 0) & (p[0] * p[4] * p[6] == 0)
+            remove = (g == 1) & (neighbours >= 2) & (neighbours <= 6) & (transitions == 1) & side
+            if remove.any():
+                g[remove] = 0
+                changed = True
+        if not changed:
+            return g[1:-1, 1:-1].astype(bool)
+
+
+def ink_points(grid):
+    pts = np.argwhere(grid).astype(np.float32) / GRID
+    if len(pts) > MAX_POINTS:
+        pts = pts[np.linspace(0, len(pts) - 1, MAX_POINTS).astype(np.int64)]
+    return pts
+
+
+def columns(pts, edges):
+    # 每一點屬於第幾欄：x 以自己的墨水左右邊界換算成 0~1，再跟欄的分界比
+    x = pts[:, 1]
+    span = max(float(x.max() - x.min()), 1e-6)
+    return np.searchsorted(edges, (x - x.min()) / span)
+
+
+@lru_cache(maxsize=2048)
+def target_glyph(text, font_path, font_size=128):
+    # 標準答案只畫一次：回傳 (正規化後的點陣, 骨架點, 骨架點的欄位, 欄的分界)
+    font = ImageFont.truetype(font_path, font_size)
+    left, top, right, bottom = font.getbbox(text)
+    img = Image.new("L", (right - left + 8, bottom - top + 8), 0)
+    ImageDraw.Draw(img).text((4 - left, 4 - top), text, font=font, fill=255)
+    mask = np.asarray(img) > 127
+    if not mask.any():
+        return None
+    # 欄的分界 = 每個字元的起點 (組合用的母音 / 聲調寬度是 0，自然跟著前一個字)，換算成墨水寬度的比例
+    xs = np.flatnonzero(mask.any(axis=0))
+    width = max(int(xs[-1] - xs[0]), 1)
+    starts = {font.getlength(text[:i]) for i in range(1, len(text))}
+    edges = np.array(sorted((4 - left + a - xs[0]) / width for a in starts), dtype=np.float32)
+    edges = edges[(edges > 0) & (edges < 1)]
+    grid = normalize(mask, cells=len(edges) + 1)
+    pts = ink_points(skeleton(grid))
+    return grid, pts, columns(pts, edges), edges
+
+
+def canvas_ink(image_data):
+    # 畫布是深色底 + 白色筆跡；有些版本 image_data 只有筆跡 (alpha)，兩種都要能判斷
+    rgba = np.asarray(image_data)
+    if rgba.ndim != 3 or rgba.shape[2] < 4:
+        return None
+    bright = rgba[..., :3].max(axis=2) > 128
+    return bright & (rgba[..., 3] > 128)
+
+
+def chamfer(a, b, a_cols=None, b_cols=None, n_cols=1, q=PERCENTILE):
+    # |a|² + |b|² - 2ab：一次矩陣乘法算完所有點對距離；有分欄的話回傳最差一欄
+    d = np.sqrt(np.maximum((a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2 * a @ b.T, 0))
+    to_b, to_a = d.min(axis=1), d.min(axis=0)
+    if a_cols is None:
+        return 0.5 * (np.percentile(to_b, q) + np.percentile(to_a, q))
+    worst = 0.0
+    for col in range(n_cols):
+        mine, theirs = to_b[a_cols == col], to_a[b_cols == col]
+        # 某一欄完全沒寫 (或多寫了一欄) 直接當最遠
+        # 兩個方向取大的：少寫一筆 (標準答案的點找不到對應) 跟多寫一筆一樣扣
+        worst = max(worst, np.percentile(mine, q) if len(mine) else 1.0, np.percentile(theirs, q) if len(theirs) else 1.0)
+    return worst
+
+
+def fit_box(pts, target_pts):
+    # 把點的外框縮放 / 平移到標準答案的外框上 (點是 (y, x))
+    low, span = pts.min(axis=0), np.ptp(pts, axis=0)
+    t_low, t_span = target_pts.min(axis=0), np.ptp(target_pts, axis=0)
+    scale = np.divide(t_span, span, out=np.zeros(2, dtype=np.float32), where=span > 2 / GRID)
+    if not scale.any():
+        return pts - low + t_low
+    # 很扁 / 很瘦 (例如一橫) 的那一邊算不出比例就跟另一邊一樣；兩邊比例差太多就往中間夾
+    scale[scale == 0] = scale.max()
+    mid = np.sqrt(scale[0] * scale[1])
+    scale = np.clip(scale, mid / np.sqrt(MAX_STRETCH), mid * np.sqrt(MAX_STRETCH))
+    return (pts - low) * scale + t_low + (t_span - span * scale) / 2
+
+
+def _transform(pts, angle, shear):
+    a = np.deg2rad(angle)
+    rotate = np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]], dtype=np.float32)
+    slant = np.array([[1, 0], [shear, 1]], dtype=np.float32)  # x += shear * y
+    return pts @ (rotate @ slant).T
+
+
+def _sample(pts, n):
+    return pts if len(pts) <= n else pts[np.linspace(0, len(pts) - 1, n).astype(np.int64)]
+
+
+def aligned_chamfer(drawn_pts, target_pts, target_cols, edges):
+    # 手寫點做幾個小的旋轉 / 斜切 (寫歪、斜體)，外框對齊標準答案之後取最像的那一個
+    n_cols = len(edges) + 1
+    drawn_few, target_few = _sample(drawn_pts, SEARCH_POINTS), _sample(target_pts, SEARCH_POINTS)
+    few_cols = columns(target_few, edges)
+    rough = []
+    for angle, shear in ALIGNMENTS:
+        pts = fit_box(_transform(drawn_few, angle, shear), target_few)
+        rough.append((chamfer(pts, target_few, columns(pts, edges), few_cols, n_cols), angle, shear))
+    # 抽樣的結果有誤差：前幾名跟「不變形」都用全部的點再算一次
+    best = None
+    for _, angle, shear in sorted(rough)[:SEARCH_KEEP] + [(None, 0, 0.0)]:
+        pts = fit_box(_transform(drawn_pts, angle, shear), target_pts)
+        dist = chamfer(pts, target_pts, columns(pts, edges), target_cols, n_cols)
+        best = dist if best is None else min(best, dist)
+    return best
+
+
+def score_handwriting(image_data, text, font_path=None):
+    """回傳 {'score': 0~100, 'iou': float, 'is_correct': bool}；沒有字型或畫布是空的回傳 None。"""
+    font_path = font_path or find_font()
+    if font_path is None or image_data is None or not str(text).strip():
+        return None
+    target = target_glyph(str(text).strip(), font_path)
+    mask = canvas_ink(image_data)
+    if target is None or mask is None:
+        return None
+    target_grid, target_pts, target_cols, edges = target
+    drawn = normalize(mask, cells=len(edges) + 1)
+    if drawn is None:
+        return None
+
+    dist = aligned_chamfer(ink_points(skeleton(drawn)), target_pts, target_cols, edges)
+    # 筆畫粗細不同，IoU 先各自膨脹一格再算，只當參考
+    grow = lambda g: g | np.roll(g, 1, 0) | np.roll(g, -1, 0) | np.roll(g, 1, 1) | np.roll(g, -1, 1)
+    a, b = grow(drawn), grow(target_grid)
+    iou = float((a & b).sum() / max((a | b).sum(), 1))
+
+    score = int(round(100 * np.clip((CHAMFER_ZERO - dist) / (CHAMFER_ZERO - CHAMFER_FULL), 0, 1)))
+    return {'score': score, 'iou': round(iou, 3), 'is_correct': score >= PASS_SCORE}
@@ -0,0 +1,234 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 沒有 pyarrow 就一直留在 JSONL，統計時直接讀 JSONL (比較慢)
+    pa = None
+    pq = None
+
+# ==========================================
+# 作答紀錄 (只追加，依日期分資料夾的欄式檔案)
+# ==========================================
+# 每次作答先追加到當天的 staging.jsonl；換日或累積到 COMPACT_ROWS 筆就轉成 Parquet。
+#   history/2024-05-01/part-1714521600000.parquet
+#   history/2024-05-02/staging.jsonl
+# 統計只讀需要的欄位成 Arrow → pandas (字串欄是 categorical)，全部用 groupby / NumPy 算，
+# 不會把整份紀錄變成一列一列的 Python 物件。
+
+COMPACT_ROWS = 5000
+OWNER = "__owner__"  # 擁有者模式的 user (有名字的同學就是名字；訪客不記)
+COLUMNS = ['ts', 'user', 'card', 'category', 'mode', 'correct', 'score', 'user_input', 'latency_ms']
+CATEGORICAL = ['user', 'category', 'mode']
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_history(directory):
+    # App 跟統計頁在同一個 process：同一個資料夾只開一個 ReviewHistory，鎖跟 staging 計數才會一致
+    directory = os.path.abspath(directory)
+    with _shared_lock:
+        if directory not in _shared:
+            _shared[directory] = ReviewHistory(directory)
+        return _shared[directory]
+
+
+class ReviewHistory:
+    def __init__(self, directory, compact_rows=COMPACT_ROWS):
+        self.directory = directory
+        self.compact_rows = compact_rows
+        self._lock = threading.Lock()
+        self._staged = {}  # day -> 目前 staging 的筆數
+        os.makedirs(directory, exist_ok=True)
+        self.compact(keep_today=True)
+
+    def _day_dir(self, day):
+        return os.path.join(self.directory, day)
+
+    def _staging(self, day):
+        return os.path.join(self._day_dir(day), "staging.jsonl")
+
+    # --- 寫入 ---
+    def record(self, card, mode, category, correct, score=None, user_input=None, latency_ms=None, user="", ts=None):
+        ts = time.time() if ts is None else ts
+        day = date.fromtimestamp(ts).isoformat()
+        entry = {
+            'ts': ts, 'user': user, 'card': int(card), 'category': category, 'mode': mode,
+            'correct': bool(correct), 'score': None if score is None else float(score),
+            'user_input': None if user_input is None else str(user_input),
+            'latency_ms': None if latency_ms is None else int(latency_ms),
+        }
+        with self._lock:
+            os.makedirs(self._day_dir(day), exist_ok=True)
+            with open(self._staging(day), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            count = self._staged.get(day)
+            if count is None:
+                count = self._count_lines(self._staging(day))
+            else:
+                count += 1
+            self._staged[day] = count
+            if count >= self.compact_rows:
+                self._compact_day(day)
+
+    @staticmethod
+    def _count_lines(path):
+        try:
+            with open(path, "rb") as f:
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        except OSError:
+            return 0
+
+    # --- staging → Parquet ---
+    def compact(self, keep_today=False):
+        # 舊日期的 staging 全部轉成 Parquet；keep_today=True 時今天的繼續用 JSONL 追加
+        today = date.today().isoformat()
+        with self._lock:
+            for path in glob.glob(os.path.join(self.directory, "*", "staging.jsonl")):
+                day = os.path.basename(os.path.dirname(path))
+                if keep_today and day == today:
+                    continue
+                self._compact_day(day)
+
+    def _compact_day(self, day):
+        if pq is None:
+            return
+        path = self._staging(day)
+        frame = _read_jsonl([path])
+        if not frame.empty:
+            out = os.path.join(self._day_dir(day), f"part-{int(time.time() * 1000)}.parquet")
+            pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), out + ".tmp", compression="zstd")
+            os.replace(out + ".tmp", out)
+        os.remove(path)
+        self._staged[day] = 0
+
+    # --- 讀取 ---
+    def days(self):
+        return sorted(d for d in os.listdir(self.directory) if os.path.isdir(self._day_dir(d)))
+
+    def load(self, columns=None, since=None, user=None):
+        # 只讀需要的欄位；since (date) 之前的資料夾直接略過。user 可以是一個名字或名字的 list
+        columns = list(columns or COLUMNS)
+        read_cols = columns + (['user'] if user is not None and 'user' not in columns else [])
+        days = [d for d in self.days() if since is None or d >= since.isoformat()]
+        parts = [p for d in days for p in glob.glob(os.path.join(self._day_dir(d), "*.parquet"))]
+        frames = []
+        if parts:
+            # 字串欄直接讀成 dictionary → pandas categorical，不會產生幾百萬個 str
+            table = pq.read_table(parts, columns=read_cols, memory_map=True,
+                                  read_dictionary=[c for c in CATEGORICAL if c in read_cols])
+            frames.append(table.to_pandas())
+        with self._lock:
+            staging = [self._staging(d) for d in days if os.path.exists(self._staging(d))]
+            staged = _read_jsonl(staging)
+        if not staged.empty:
+            staged = staged[read_cols]
+            for col in CATEGORICAL:
+                if col in read_cols:
+                    staged[col] = staged[col].astype(object).astype('category')
+            frames.append(staged)
+        if not frames:
+            return _empty_frame(read_cols)
+        df = _concat(frames)
+        if user is not None:
+            df = df[df['user'].isin([user] if isinstance(user, str) else list(user))]
+        return df[columns]
+
+
+def _concat(frames):
+    if len(frames) == 1:
+        return frames[0]
+    out = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            out[col] = union_categoricals([f[col] for f in frames], ignore_order=True)
+        else:
+            out[col] = np.concatenate([f[col].to_numpy() for f in frames])
+    return pd.DataFrame(out)
+
+
+def _empty_frame(columns):
+    return pd.DataFrame({c: pd.Series(dtype='float64' if c in ('ts', 'score') else 'object') for c in columns})
+
+
+def _read_jsonl(paths):
+    # 只有 staging (當天、最多 COMPACT_ROWS 筆) 會走這裡
+    records = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # 寫到一半的最後一行
+        except OSError:
+            continue
+    if not records:
+        return _empty_frame(COLUMNS)
+    df = pd.DataFrame.from_records(records).reindex(columns=COLUMNS)
+    df['ts'] = df['ts'].astype('float64')
+    df['card'] = df['card'].astype('int64')
+    df['correct'] = df['correct'].astype(bool)
+    df['score'] = pd.to_numeric(df['score'], errors='coerce').astype('float32')
+    df['latency_ms'] = pd.to_numeric(df['latency_ms'], errors='coerce').astype('float32')
+    for col in ('user', 'category', 'mode', 'user_input'):
+        df[col] = df[col].astype('string')
+    return df
+
+
+# ==========================================
+# 統計 (全部向量化)
+# ==========================================
+
+def accuracy_by(df, keys):
+    grouped = df.groupby(keys, observed=True)['correct']
+    out = pd.DataFrame({'attempts': grouped.size(), 'accuracy': grouped.mean()})
+    return out.sort_values('attempts', ascending=False)
+
+
+def hardest_cards(df, min_attempts=3, n=20):
+    grouped = df.groupby('card')['correct']
+    stats = pd.DataFrame({'attempts': grouped.size(), 'accuracy': grouped.mean()})
+    stats = stats[stats['attempts'] >= min_attempts]
+    return stats.sort_values(['accuracy', 'attempts'], ascending=[True, False]).head(n)
+
+
+def local_days(ts):
+    # ts (秒) → 本地時區的「第幾天」(1970-01-01 = 0)
+    offset = datetime.now().astimezone().utcoffset().total_seconds()
+    return ((np.asarray(ts, dtype='float64') + offset) // 86400).astype('int64')
+
+
+def daily_counts(df):
+    day = local_days(df['ts'])
+    days, counts = np.unique(day, return_counts=True)
+    correct = np.bincount(np.searchsorted(days, day), weights=df['correct'].to_numpy(dtype='float64'),
+                          minlength=len(days))
+    index = pd.to_datetime(days, unit='D')
+    return pd.DataFrame({'attempts': counts, 'accuracy': correct / np.maximum(counts, 1)}, index=index)
+
+
+def streaks(df, today=None):
+    # 連續有作答的天數：目前 (今天或昨天還有作答才算) 跟歷史最長
+    if df.empty:
+        return {'current': 0, 'longest': 0, 'active_days': 0}
+    days = np.unique(local_days(df['ts']))
+    breaks = np.flatnonzero(np.diff(days) != 1)
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(days) - 1]])
+    lengths = ends - starts + 1
+    today = (today or date.today()).toordinal() - date(1970, 1, 1).toordinal()
+    current = int(lengths[-1]) if days[-1] >= today - 1 else 0
+    return {'current': current, 'longest': int(lengths.max()), 'active_days': int(len(days))}
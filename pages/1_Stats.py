@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from deck_snapshot import DeckSnapshot  # noqa: E402
+from history import OWNER, accuracy_by, daily_counts, hardest_cards, shared_history, streaks  # noqa: E402
+
+# ==========================================
+# 📊 學習統計 (讀 history/ 的作答紀錄)
+# ==========================================
+st.set_page_config(page_title="學習統計 📊", page_icon="🐘", layout="centered")
+
+CACHE_DIR = os.environ.get("THAI_CACHE_DIR", os.path.join(ROOT, ".cache"))
+
+
+def get_history():
+    # 跟 App 共用同一個 ReviewHistory (同一把鎖)
+    return shared_history(os.path.join(CACHE_DIR, "history"))
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def card_names():
+    # 只拿來把 card id 換成泰文；沒有本地快照就只顯示 id
+    storage = "sqlite" if os.environ.get("THAI_STORAGE", "gsheets").lower() == "sqlite" else "gsheets"
+    deck = DeckSnapshot(os.path.join(CACHE_DIR, "deck", storage)).load()
+    if deck is None:
+        return None
+    return deck[['Thai', 'Meaning']]
+
+
+st.title("📊 學習統計")
+
+col1, col2 = st.columns(2)
+user = col1.text_input("👤 名字 (空白 = 擁有者)", key="stats_user").strip()
+period = col2.selectbox("期間", [7, 30, 90, None], index=1, format_func=lambda d: f"最近 {d} 天" if d else "全部")
+everyone = st.toggle("所有人一起算")
+
+start = time.perf_counter()
+since = date.today() - timedelta(days=period - 1) if period else None
+# 空白 = 擁有者；分開記擁有者之前的舊紀錄 user 是空白，也算擁有者的
+df = get_history().load(['ts', 'card', 'category', 'mode', 'correct'], since=since,
+                        user=None if everyone else (user or [OWNER, ""]))
+loaded = time.perf_counter() - start
+
+if df.empty:
+    st.info("還沒有作答紀錄，先去答幾題吧！")
+    st.stop()
+
+streak = streaks(df)
+by_category = accuracy_by(df, 'category')
+by_mode = accuracy_by(df, ['category', 'mode'])
+hardest = hardest_cards(df)
+daily = daily_counts(df)
+computed = time.perf_counter() - start - loaded
+
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("作答次數", f"{len(df):,}")
+c2.metric("答對率", f"{df['correct'].mean():.0%}")
+c3.metric("🔥 連續天數", streak['current'])
+c4.metric("最長連續", streak['longest'])
+
+st.subheader("每天作答")
+st.bar_chart(daily['attempts'])
+st.line_chart(daily['accuracy'])
+
+st.subheader("各類別 / 模式答對率")
+st.dataframe(by_category.style.format({'accuracy': '{:.0%}'}), use_container_width=True)
+st.dataframe(by_mode.style.format({'accuracy': '{:.0%}'}), use_container_width=True)
+
+st.subheader("😵 最常錯的卡")
+names = card_names()
+if names is not None:
+    hardest = hardest.join(names, how='left')
+st.dataframe(hardest.style.format({'accuracy': '{:.0%}'}), use_container_width=True)
+
+st.caption(f"⏱️ 讀取 {loaded * 1000:.0f} ms、計算 {computed * 1000:.0f} ms ({len(df):,} 筆)")
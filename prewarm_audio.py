@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import os
+import sys
+
+import pandas as pd
+
+from audio_cache import AudioCache, deck_tts_texts, prewarm
+from deck_snapshot import DeckSnapshot
+
+# ==========================================
+# 讀書前先把整副牌的音檔下載到本地 (跟 App 共用同一個音檔快取)
+#   python prewarm_audio.py                    # 用 App 存的本地牌組快照
+#   python prewarm_audio.py --storage sqlite   # 快照是 THAI_STORAGE=sqlite 的 App 存的
+#   python prewarm_audio.py --deck cards.csv   # 或指定 CSV / Parquet
+# ==========================================
+
+# 跟 App / 統計頁一樣：THAI_CACHE_DIR 可以改位置，快照放在 deck/<儲存後端>
+CACHE_DIR = os.environ.get("THAI_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+STORAGES = ("gsheets", "sqlite")
+
+
+def read_deck(path, storage="gsheets"):
+    if path is None:
+        df = DeckSnapshot(os.path.join(CACHE_DIR, "deck", storage)).load()
+        if df is None:
+            sys.exit("找不到本地牌組快照，請先開一次 App 或用 --deck 指定檔案。")
+        return df
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    df = pd.read_csv(path, dtype=str).fillna("")
+    df.columns = df.columns.str.strip()
+    for col in ['Thai', 'TTS_Text']:
+        if col not in df.columns:
+            df[col] = ""
+        df[col] = df[col].str.removeprefix("'")
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="預先產生整副牌的 TTS 音檔")
+    parser.add_argument("--deck", help="CSV 或 Parquet 牌組檔 (預設用 App 的本地快照)")
+    parser.add_argument("--storage", choices=STORAGES,
+                        default="sqlite" if os.environ.get("THAI_STORAGE", "gsheets").lower() == "sqlite" else "gsheets",
+                        help="讀哪一個儲存後端的快照 (預設跟 App 一樣看 THAI_STORAGE)")
+    parser.add_argument("--cache-dir", default=os.environ.get("THAI_AUDIO_CACHE_DIR", os.path.join(CACHE_DIR, "audio")))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--max-disk-mb", type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    df = read_deck(args.deck, args.storage)
+    df = df[df['Thai'].str.strip() != ""]
+    cache = AudioCache(cache_dir=args.cache_dir, max_disk_bytes=args.max_disk_mb * 1024 * 1024)
+
+    def progress(done, total, failed):
+        print(f"\r{done}/{total} 完成，失敗 {failed}", end="", flush=True)
+
+    result = asyncio.run(prewarm(cache, deck_tts_texts(df), args.concurrency, args.retries, progress))
+    print()
+    print(f"新下載 {result['synthesized']} 個音檔，失敗 {len(result['failed'])} 個")
+    for text in result['failed']:
+        print(f"  ✗ {text}")
+    return 1 if result['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# ==========================================
+# 每次 rerun 的耗時量測 (各階段 p50 / p95) + 單次 cProfile
+# ==========================================
+# Streamlit 每點一下都會重跑整支 Thai.py (答題區是 st.fragment，只重跑那一塊)，這裡把各階段包成 span，
+# 整個 process 共用一份最近 N 次的紀錄，方便看慢在哪裡。
+# "rerun" 是整頁重跑，"fragment" 是答題區 (不管是整頁重跑裡面的，還是 fragment 自己重跑)。
+
+
+class PerfRecorder:
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    @contextmanager
+    def span(self, stage, state=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # st.rerun() / st.stop() 是用例外跳出的，也要記到
+            self.record(stage, time.perf_counter() - start)
+            if state is not None:
+                mark_rerun(state)
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: np.fromiter(values, dtype=float) for stage, values in self._samples.items()}
+        rows = []
+        for stage, values in sorted(samples.items()):
+            if not len(values):
+                continue
+            p50, p95 = np.percentile(values, [50, 95]) * 1000
+            rows.append({
+                "stage": stage,
+                "count": int(len(values)),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "max_ms": round(float(values.max() * 1000), 2),
+            })
+        return rows
+
+    def to_json(self):
+        return json.dumps({"generated_at": time.time(), "stages": self.summary()}, ensure_ascii=False, indent=2)
+
+    def to_csv(self):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=["stage", "count", "p50_ms", "p95_ms", "max_ms"])
+        writer.writeheader()
+        writer.writerows(self.summary())
+        return out.getvalue()
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(self.to_csv() if path.endswith(".csv") else self.to_json())
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+# --- 整個 rerun 的起訖 ---
+# 用 st.rerun() 結束的 rerun 走不到檔案最後一行，
+# 所以在下一次 rerun 開始時補記上一次，時間算到它最後一個 span 結束為止。
+
+def begin_rerun(recorder, state, profile=False, profile_dir=None, stage="rerun"):
+    # stage="fragment"：st.fragment 自己重跑的時候不會經過整頁的 begin / end，另外記一筆
+    runs = state.setdefault("open_runs", {})
+    pending = runs.get(stage)
+    if pending is not None:
+        _close_rerun(recorder, state, stage, pending["at"] + pending["elapsed"], profile_dir)
+    runs[stage] = {"at": time.perf_counter(), "elapsed": 0.0, "profiler": None}
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        runs[stage]["profiler"] = profiler
+
+
+def mark_rerun(state):
+    # 每個 span 結束時更新，讓被 st.rerun() 打斷的 rerun 也知道大概跑到哪裡
+    now = time.perf_counter()
+    for pending in state.get("open_runs", {}).values():
+        pending["elapsed"] = now - pending["at"]
+
+
+def end_rerun(recorder, state, profile_dir=None, stage="rerun"):
+    _close_rerun(recorder, state, stage, time.perf_counter(), profile_dir)
+
+
+def _close_rerun(recorder, state, stage, finish, profile_dir=None):
+    pending = state.get("open_runs", {}).pop(stage, None)
+    if pending is None:
+        return
+    recorder.record(stage, finish - pending["at"])
+    profiler = pending["profiler"]
+    if profiler is not None:
+        profiler.disable()
+        state["last_profile"] = hotspots(profiler)
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, f"{stage}-{int(time.time())}.prof"))
+
+
+def hotspots(profiler, limit=25):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
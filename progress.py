@@ -0,0 +1,179 @@
+import os
+import re
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from distractors import DistractorIndex
+from speech import prepare_target
+from storage import version_key
+
+# ==========================================
+# 多人共用：唯讀牌組 + 每個人自己的進度
+# ==========================================
+# 卡片內容 (Thai / TTS_Text / Pronunciation / Meaning / Category) 整個 process 只存一份，
+# 每個 session 只有自己的幾個 int 陣列 (Times, Next, Updated)，用位置對應到牌組的每一列。
+# deck 上的 base_* 是 Sheet 的進度 (所有 session 唯讀)，只透過 apply_remote 合併：
+# 擁有者的作答、別台裝置同步下來的列都走這裡，再記進 remote_log 讓其他 session 跟上。
+
+CONTENT_COLS = ['Thai', 'TTS_Text', 'Pronunciation', 'Meaning', 'Category']
+
+
+class SharedDeck:
+    def __init__(self, df):
+        self.content = df[CONTENT_COLS].copy() if not df.empty else pd.DataFrame(columns=CONTENT_COLS)
+        self.labels = self.content.index.to_numpy()
+        self.positions = {label: i for i, label in enumerate(self.labels)}
+        # Sheet 上的 Times / Next (擁有者的進度)
+        if df.empty:
+            self.base_times = np.zeros(0, dtype=np.int32)
+            self.base_next = np.zeros(0, dtype=np.int32)
+            self.base_updated = np.zeros(0, dtype=np.int64)
+        else:
+            self.base_times = df['Times'].to_numpy(dtype=np.int32)
+            self.base_next = np.array([d.toordinal() for d in df['Next']], dtype=np.int32)
+            self.base_updated = (np.array(df['Updated'], dtype=np.int64) if 'Updated' in df.columns
+                                 else np.zeros(len(df), dtype=np.int64))
+        # 合併進來的列 (依順序)；每個 session 記自己看到第幾筆，只更新新增的部分
+        self.remote_log = []
+        self._remote_lock = threading.Lock()
+        # 進度已經跟上的遠端版本 (由讀進來的人設定；None = 不知道，下次 pull 會比對 Updated)
+        self.synced_revision = None
+        self.distractors = DistractorIndex(self.content) if not df.empty else None
+        # 口說題只出句子：句子的正規化 / 斷詞結果先算好，評分時只剩對齊
+        self.speech_targets = {}
+        if not df.empty:
+            sentences = self.content[self.content['Category'] == 'Sentence']
+            tts = sentences['TTS_Text'].fillna("").astype(str)
+            tts = tts.where(tts.str.strip() != "", sentences['Thai'])
+            self.speech_targets = {label: (text.strip(), prepare_target(text.strip())) for label, text in tts.items()}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def updated_series(self):
+        return pd.Series(self.base_updated, index=self.labels)
+
+    def apply_remote(self, changes):
+        # changes = {label: {'Times', 'Next', 'Updated'}}；只收比本地新的 (version_key 一樣的規則)，回傳收下的 label
+        applied = []
+        with self._remote_lock:
+            for label, delta in changes.items():
+                pos = self.positions.get(label)
+                if pos is None:
+                    continue
+                local = {'Times': int(self.base_times[pos]), 'Updated': int(self.base_updated[pos]),
+                         'Next': date.fromordinal(int(self.base_next[pos])).isoformat()}
+                try:
+                    next_day = date.fromisoformat(str(delta['Next'])[:10])
+                    newer = version_key({**delta, 'Next': next_day.isoformat()}) > version_key(local)
+                except (KeyError, TypeError, ValueError):
+                    continue  # 壞掉的列跳過，不要讓整批合併失敗
+                if not newer:
+                    continue
+                self.base_times[pos] = int(delta['Times'])
+                self.base_next[pos] = next_day.toordinal()
+                self.base_updated[pos] = int(delta['Updated'])
+                applied.append(label)
+            self.remote_log.extend(applied)
+        return applied
+
+
+class ProgressOverlay:
+    def __init__(self, deck, times, next_days, path=None, updated=None, owner=False):
+        self.deck = deck
+        self.times = times          # int32，依牌組位置
+        self.next_days = next_days  # int32，date.toordinal()
+        self.updated = updated      # int64 epoch ms；只有擁有者要跟 Sheet 比新舊，其他人是 None (省 8 bytes/張)
+        self.path = path
+        self.owner = owner          # True：作答寫回 Sheet，並合併進共用的 deck
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_sheet(cls, deck, owner=False):
+        # 從 Sheet 上的進度開始 (複製一份，不會動到共用的 deck)。
+        # owner=False 是訪客：答題結果只留在這個 session；owner=True 才寫回 Sheet
+        updated = deck.base_updated.copy() if owner else None
+        return cls(deck, deck.base_times.copy(), deck.base_next.copy(), updated=updated, owner=owner)
+
+    def delta(self, label):
+        pos = self.deck.positions[label]
+        return {'Times': int(self.times[pos]), 'Updated': int(self.updated[pos]),
+                'Next': date.fromordinal(int(self.next_days[pos])).isoformat()}
+
+    def follow_deck(self, labels):
+        # deck 合併進來的列比自己新就跟上 (擁有者的其他分頁、別台裝置)；回傳有變動的 label
+        deck = self.deck
+        changed = []
+        for label in labels:
+            pos = deck.positions.get(label)
+            if pos is None:
+                continue
+            remote = {'Times': int(deck.base_times[pos]), 'Updated': int(deck.base_updated[pos]),
+                      'Next': date.fromordinal(int(deck.base_next[pos])).isoformat()}
+            if version_key(remote) > version_key(self.delta(label)):
+                self.times[pos] = deck.base_times[pos]
+                self.next_days[pos] = deck.base_next[pos]
+                self.updated[pos] = deck.base_updated[pos]
+                changed.append(label)
+        return changed
+
+    @classmethod
+    def for_user(cls, deck, user, directory):
+        # 新同學從零開始：Times 0、今天到期
+        path = os.path.join(directory, f"{safe_name(user)}.npz")
+        times = np.zeros(len(deck), dtype=np.int32)
+        next_days = np.full(len(deck), date.today().toordinal(), dtype=np.int32)
+        try:
+            with np.load(path) as saved:
+                # 用 label 對回現在的牌組，牌組變了也不會錯位
+                where = pd.Index(deck.labels).get_indexer(saved['labels'])
+                found = where >= 0
+                times[where[found]] = saved['times'][found]
+                next_days[where[found]] = saved['next_days'][found]
+        except (OSError, KeyError, ValueError):
+            pass
+        return cls(deck, times, next_days, path)
+
+    # progress[idx, 'Times'] / progress[idx, 'Next']，用法跟 df.at 一樣
+    def __getitem__(self, key):
+        label, col = key
+        pos = self.deck.positions[label]
+        if col == 'Times':
+            return int(self.times[pos])
+        if col == 'Next':
+            return date.fromordinal(int(self.next_days[pos]))
+        if col == 'Updated':
+            return int(self.updated[pos]) if self.updated is not None else 0
+        raise KeyError(col)
+
+    def __setitem__(self, key, value):
+        label, col = key
+        pos = self.deck.positions[label]
+        if col == 'Times':
+            self.times[pos] = int(value)
+        elif col == 'Next':
+            self.next_days[pos] = value.toordinal()
+        elif col == 'Updated':
+            if self.updated is not None:
+                self.updated[pos] = int(value)
+        else:
+            raise KeyError(col)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        with self._lock:
+            np.savez(tmp, labels=self.deck.labels, times=self.times, next_days=self.next_days)
+            os.replace(tmp, self.path)
+
+    def nbytes(self):
+        return self.times.nbytes + self.next_days.nbytes + (self.updated.nbytes if self.updated is not None else 0)
+
+
+def safe_name(user):
+    return re.sub(r"[^\w\-]", "_", user.strip())[:64] or "_"
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from datetime import date
+
+# ==========================================
+# Write-behind 複習紀錄 (先記在 journal，背景再同步到 Google Sheet)
+# ==========================================
+# 每次作答只把 (row, Times, Next, Updated) 追加到 journal，
+# 背景執行緒定時或累積到 batch_size 筆之後，把同一列的多次作答合併成一筆，
+# 再交給 sink 只更新有變動的儲存格。UI 完全不用等遠端寫入。
+# Updated 是作答時間 (epoch ms)；遠端那一列比較新時 sink 會把遠端的值回傳，
+# 放在 rejected 裡等畫面那邊拿去更新 (take_rejected)。
+
+
+class ReviewJournal:
+    def __init__(self, sink, path=None, flush_interval=5.0, batch_size=20):
+        # sink(deltas) : deltas = {row: {'Times': int, 'Next': 'YYYY-MM-DD', 'Updated': ms}}，失敗時丟例外
+        #                回傳遠端比較新、沒寫進去的 {row: 遠端的值} (或 None)
+        self.sink = sink
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = {}
+        self._pending_count = 0
+        self._rejected = {}
+        self._thread = None
+        self._stopped = False
+
+        self.flushed_rows = 0
+        self.flush_count = 0
+        self.last_error = None
+        self.last_flush_at = None
+
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._replay()
+            if self._pending:
+                # 上次沒送完的作答馬上開始補送，不用等下一次作答
+                self._ensure_thread()
+
+    # --- journal 檔案 ---
+    def _replay(self):
+        # 上次沒同步完的作答 (程式被關掉、網路斷掉) 重新放回待送清單
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 寫到一半的最後一行
+                    # 舊版 journal 沒有 Updated，用寫入時間代替
+                    updated = entry.get("Updated") or int(entry.get("ts", 0) * 1000)
+                    self._pending[entry["row"]] = {"Times": entry["Times"], "Next": entry["Next"], "Updated": updated}
+                    self._pending_count += 1
+        except OSError:
+            pass
+
+    def _append(self, deltas):
+        if not self.path:
+            return
+        now = time.time()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({"row": row, **delta, "ts": now}, ensure_ascii=False) + "\n"
+                         for row, delta in deltas.items())
+
+    def _rewrite(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row, delta in self._pending.items():
+                f.write(json.dumps({"row": row, **delta, "ts": time.time()}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+    # --- 對外介面 ---
+    def record(self, row, times, next_date, updated=None):
+        self.record_many({row: (times, next_date, updated)})
+
+    def record_many(self, results):
+        # results = {row: (Times, Next, Updated)}；題組做完一次記進來，只開一次檔案
+        now = int(time.time() * 1000)
+        deltas = {int(row): {"Times": int(times), "Next": str(next_date)[:10], "Updated": int(updated or now)}
+                  for row, (times, next_date, updated) in results.items()}
+        if not deltas:
+            return
+        with self._lock:
+            self._pending.update(deltas)
+            self._pending_count += len(deltas)
+            self._append(deltas)
+            if self._pending_count >= self.batch_size:
+                self._wake.notify()
+        self._ensure_thread()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def overlay(self, df):
+        # 重新讀表之後，把還沒同步上去的作答蓋回去，畫面才不會倒退
+        pending = self.pending()
+        if not pending:
+            return df
+        for row, delta in pending.items():
+            if row in df.index:
+                df.at[row, "Times"] = delta["Times"]
+                df.at[row, "Next"] = date.fromisoformat(delta["Next"])
+                if "Updated" in df.columns:
+                    df.at[row, "Updated"] = delta["Updated"]
+        return df
+
+    def take_rejected(self):
+        # 遠端比較新而沒寫入的列 (別台裝置的作答)；拿一次就清掉
+        with self._lock:
+            rejected, self._rejected = self._rejected, {}
+        return rejected
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = dict(self._pending)
+                self._pending_count = 0
+            try:
+                rejected = self.sink(batch) or {}
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                return 0
+            with self._lock:
+                # 送出期間又被作答的列保留較新的值
+                for row, delta in batch.items():
+                    if self._pending.get(row) == delta:
+                        del self._pending[row]
+                self._rejected.update(rejected)
+                self._rewrite()
+            self.flushed_rows += len(batch)
+            self.flush_count += 1
+            self.last_error = None
+            self.last_flush_at = time.time()
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending_rows": pending,
+            "flushed_rows": self.flushed_rows,
+            "flush_count": self.flush_count,
+            "last_error": self.last_error,
+            "last_flush_at": self.last_flush_at,
+        }
+
+    # --- 背景同步 ---
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="review-journal-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            with self._lock:
+                if self._pending_count < self.batch_size:
+                    self._wake.wait(self.flush_interval)
+                if self._stopped:
+                    break
+            self.flush()
+
+    def close(self):
+        self._stopped = True
+        with self._lock:
+            self._wake.notify()
+        self.flush()
+
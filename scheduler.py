@@ -0,0 +1,228 @@
+import random
+from array import array
+from datetime import date
+
+import numpy as np
+
+# ==========================================
+# 到期佇列 (取代每題都掃一次整個 df)
+# ==========================================
+# 到期的卡片放在 pool (int32 陣列)，pool 旁邊用 Fenwick tree 存權重，抽題 / 更新都是 O(log n)；
+# 不加權的時候不需要 tree，直接隨機抽 pool 的一格。換日的時候用 NumPy 掃一次 Next 找新到期的卡。
+# 內部一律用「牌組位置」，Times / Next 陣列直接用 ProgressOverlay 的那兩個，
+# 卡片 id / 位置對照也共用 deck 的；每個 session 只多 pool + 位置陣列 (+ 加權時的 tree)，每張卡 8~16 bytes。
+
+WEIGHTINGS = {
+    None: "不加權",
+    'overdue': "逾期越久越優先",
+    'low_times': "熟練度低優先",
+}
+
+
+def to_ordinal(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class _Fenwick:
+    # 只存樹本身 (每格 8 bytes)；單點的值用兩個前綴和相減
+    def __init__(self, size, values=None):
+        self.size = size
+        self.tree = array('d', bytes(8 * (size + 1)))
+        if values is not None:
+            # O(n) 建樹
+            for i in range(1, size + 1):
+                if i <= len(values):
+                    self.tree[i] += values[i - 1]
+                parent = i + (i & -i)
+                if parent <= size:
+                    self.tree[parent] += self.tree[i]
+        self.top = 1
+        while self.top * 2 <= size:
+            self.top *= 2
+
+    def get(self, pos):
+        return self.prefix(pos + 1) - self.prefix(pos)
+
+    def set(self, pos, value):
+        delta = value - self.get(pos)
+        i = pos + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        return self.prefix(self.size)
+
+    def prefix(self, n):
+        s = 0.0
+        while n > 0:
+            s += self.tree[n]
+            n -= n & -n
+        return s
+
+    def find(self, r):
+        # 找出第一個前綴和 > r 的位置
+        pos = 0
+        step = self.top
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= r:
+                pos = nxt
+                r -= self.tree[nxt]
+            step //= 2
+        return pos
+
+
+class DueScheduler:
+    def __init__(self, ids, times, next_days, today, weighting=None, rng=None, positions=None):
+        # times / next_days：依位置排列、可寫入的 int 序列 (next_days 是 date.toordinal())
+        self.weighting = weighting
+        self.rng = rng or random.Random()
+        self.today = to_ordinal(today)
+
+        self._all = ids
+        self._all_pos = positions if positions is not None else {card: i for i, card in enumerate(ids)}
+        self._times = times
+        self._next = next_days
+
+        due = np.flatnonzero(np.asarray(self._next) <= self.today).astype(np.int32)
+        self._pool = array('i', due.tobytes())                           # slot -> 位置
+        self._pool_pos = np.full(len(self._all), -1, dtype=np.int32)     # 位置 -> slot (-1 = 沒到期)
+        self._pool_pos[due] = np.arange(len(due), dtype=np.int32)
+        self._tree = None
+        if weighting is not None:
+            self._tree = _Fenwick(len(self._all), [self._weight(int(pos)) for pos in due])
+
+    @classmethod
+    def from_frame(cls, df, today, weighting=None, rng=None):
+        if df.empty:
+            return cls([], array('i'), array('i'), today, weighting, rng)
+        times = array('i', (int(t) for t in df['Times']))
+        next_days = array('i', (to_ordinal(n) for n in df['Next']))
+        return cls(df.index.tolist(), times, next_days, today, weighting, rng)
+
+    @classmethod
+    def from_progress(cls, progress, today, weighting=None, rng=None):
+        deck = progress.deck
+        return cls(deck.labels, progress.times, progress.next_days, today, weighting, rng, deck.positions)
+
+    # --- 權重 ---
+    def _weight(self, pos):
+        if self.weighting == 'overdue':
+            return 1.0 + max(self.today - int(self._next[pos]), 0)
+        if self.weighting == 'low_times':
+            return 1.0 / (1 + max(int(self._times[pos]), 0))
+        return 1.0
+
+    # --- pool (到期) ---
+    def _slot(self, pos):
+        slot = int(self._pool_pos[pos]) if pos is not None else -1
+        return slot if slot >= 0 else None
+
+    def _pool_add(self, pos):
+        slot = len(self._pool)
+        self._pool.append(pos)
+        self._pool_pos[pos] = slot
+        if self._tree is not None:
+            self._tree.set(slot, self._weight(pos))
+
+    def _pool_remove(self, pos):
+        # 跟最後一個交換後刪掉，O(log n)
+        slot = int(self._pool_pos[pos])
+        self._pool_pos[pos] = -1
+        last = self._pool.pop()
+        last_slot = len(self._pool)
+        if last != pos:
+            self._pool[slot] = last
+            self._pool_pos[last] = slot
+            if self._tree is not None:
+                self._tree.set(slot, self._tree.get(last_slot))
+        if self._tree is not None:
+            self._tree.set(last_slot, 0.0)
+
+    def set_today(self, today):
+        today = to_ordinal(today)
+        if today == self.today:
+            return
+        if today < self.today:
+            # 時間倒退 (例如改了系統時間) 就整個重建
+            self.__init__(self._all, self._times, self._next, today, self.weighting, self.rng, self._all_pos)
+            return
+        self.today = today
+        for pos in np.flatnonzero((np.asarray(self._next) <= today) & (self._pool_pos < 0)):
+            self._pool_add(int(pos))
+        if self.weighting == 'overdue':
+            for slot, pos in enumerate(self._pool):
+                self._tree.set(slot, self._weight(pos))
+
+    # --- 對外介面 ---
+    def due_count(self):
+        return len(self._pool)
+
+    def is_due(self, card):
+        return self._slot(self._all_pos.get(card)) is not None
+
+    def update(self, card, times, next_date):
+        # 作答後呼叫，只動這一張卡
+        pos = self._all_pos.get(card)
+        if pos is None:
+            return
+        next_day = to_ordinal(next_date)
+        self._times[pos] = int(times)
+        self._next[pos] = next_day
+        slot = self._slot(pos)
+        if next_day <= self.today:
+            if slot is None:
+                self._pool_add(pos)
+            elif self._tree is not None:
+                self._tree.set(slot, self._weight(pos))
+        elif slot is not None:
+            self._pool_remove(pos)
+
+    def pick_due(self, exclude=None):
+        if not self._pool:
+            return None
+        if len(self._pool) == 1:
+            return self._all[self._pool[0]]
+
+        excluded = self._all_pos.get(exclude)
+        excluded_slot = self._slot(excluded)
+        if self._tree is None:
+            # 不加權：從 n-1 格裡抽，跳過要排除的那一格
+            n = len(self._pool)
+            if excluded_slot is None:
+                return self._all[self._pool[self.rng.randrange(n)]]
+            k = self.rng.randrange(n - 1)
+            return self._all[self._pool[k + 1 if k >= excluded_slot else k]]
+
+        if excluded_slot is not None:
+            saved = self._tree.get(excluded_slot)
+            self._tree.set(excluded_slot, 0.0)
+        try:
+            total = self._tree.total()
+            if total <= 0:
+                candidates = [p for p in self._pool if p != excluded]
+                return self._all[self.rng.choice(candidates)]
+            slot = min(self._tree.find(self.rng.random() * total), len(self._pool) - 1)
+            pos = self._pool[slot]
+            if pos == excluded:  # 浮點誤差剛好落在被排除的位置
+                pos = self._pool[(slot + 1) % len(self._pool)]
+            return self._all[pos]
+        finally:
+            if excluded_slot is not None:
+                self._tree.set(excluded_slot, saved)
+
+    def pick_any(self, exclude=None):
+        if not len(self._all):  # ids 可能是 numpy 陣列 (deck.labels)
+            return None
+        if len(self._all) == 1 or exclude not in self._all_pos:
+            return self._all[self.rng.randrange(len(self._all))]
+        # 從 n-1 個位置裡抽，跳過要排除的那一個
+        k = self.rng.randrange(len(self._all) - 1)
+        if k >= self._all_pos[exclude]:
+            k += 1
+        return self._all[k]
@@ -0,0 +1,117 @@
+import random
+
+import numpy as np
+
+from srs import assign_modes
+
+# ==========================================
+# 題組模式：一次規劃 N 題
+# ==========================================
+# 單題模式每一題都要 選題 → st.rerun() → 出選項 → TTS；
+# 題組開始時用陣列一次選好 N 張卡、依 Times 分配模式、抽完所有干擾選項，
+# 之後每一題只是從計畫裡拿下一個，作答結果也等整組做完才一次存檔。
+
+MC_MODES = ['char_pron_to_thai', 'char_thai_to_meaning', 'word_thai_to_meaning', 'word_listen_to_thai', 'sentence_listen_to_meaning']
+THAI_OPTION_MODES = ['char_pron_to_thai', 'word_listen_to_thai']
+
+
+def due_weights(times, next_days, today, weighting=None):
+    # DueScheduler._weight 的向量版
+    if weighting == 'overdue':
+        return 1.0 + np.maximum(today - next_days, 0)
+    if weighting == 'low_times':
+        return 1.0 / (1 + np.maximum(times, 0))
+    return np.ones(len(times))
+
+
+def pick_session_cards(times, next_days, today, size, weighting=None, rng=None):
+    # 先從到期的卡依權重抽 (不重複)，不夠再從沒到期的隨機補；回傳 (位置, 是否到期)
+    rng = rng or np.random.default_rng()
+    next_days = np.asarray(next_days)
+    due = np.flatnonzero(next_days <= today)
+    take = min(size, len(due))
+    picked = np.empty(0, dtype=np.int64)
+    if take:
+        w = due_weights(np.asarray(times)[due], next_days[due], today, weighting)
+        picked = rng.choice(due, take, replace=False, p=w / w.sum())
+    if take < size:
+        rest = np.flatnonzero(next_days > today)
+        extra = rng.choice(rest, min(size - take, len(rest)), replace=False)
+        picked = np.concatenate([picked, extra])
+    return picked, np.arange(len(picked)) < take
+
+
+class StudySession:
+    def __init__(self, labels, quiz_data, was_due):
+        self.labels = labels
+        self.quiz_data = quiz_data
+        self.was_due = was_due
+        self.cursor = 0
+        self.results = {}  # label -> (Times, Next, Updated)，整組做完才存
+        self.audio = {}    # tts_text -> Future (synthesize_batch)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def done(self):
+        return self.cursor >= len(self.labels)
+
+    def next_card(self):
+        if self.done:
+            return None, None
+        i = self.cursor
+        self.cursor += 1
+        return self.labels[i], self.quiz_data[i]
+
+    def status_text(self):
+        i = max(self.cursor - 1, 0)
+        kind = "📝 題組複習" if self.was_due[i] else "🔀 題組練習"
+        return f"{kind} ({self.cursor}/{len(self)})"
+
+    def record(self, label, times, next_date, updated=None):
+        self.results[label] = (int(times), next_date, updated)
+
+    def correct_count(self, today):
+        # 答對的卡 Next 一定在今天之後
+        return sum(1 for _, next_date, _ in self.results.values() if next_date > today)
+
+
+def plan_session(deck, progress, today, size, weighting=None, hard_distractors=False, rng=None):
+    rng = rng or random.Random()
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    content = deck.content
+    positions, was_due = pick_session_cards(progress.times, progress.next_days, today.toordinal(),
+                                            size, weighting, np_rng)
+    labels = [deck.labels[p] for p in positions]
+    if not labels:
+        return StudySession([], [], [])
+
+    rows = content.loc[labels]
+    modes = assign_modes(rows['Category'].to_numpy(), progress.times[positions], np_rng)
+    tts = rows['TTS_Text'].fillna("").astype(str)
+    tts = tts.where(tts.str.strip() != "", rows['Thai']).tolist()
+
+    # 選擇題的干擾選項：依出題欄位分兩批，各一次 pick_many
+    options = [[] for _ in labels]
+    for field, wanted in (('Thai', True), ('Meaning', False)):
+        which = [i for i, m in enumerate(modes) if m in MC_MODES and (m in THAI_OPTION_MODES) == wanted]
+        if not which:
+            continue
+        picks = deck.distractors.pick_many([labels[i] for i in which], hard=hard_distractors, field=field)
+        records = content.loc[[l for p in picks for l in p]].to_dict('records')
+        start = 0
+        for i, p in zip(which, picks):
+            opts = records[start:start + len(p)] + [rows.iloc[i].to_dict()]
+            start += len(p)
+            rng.shuffle(opts)
+            options[i] = opts
+
+    thai, meaning, pron = rows['Thai'].tolist(), rows['Meaning'].tolist(), rows['Pronunciation'].tolist()
+    category = rows['Category'].tolist()
+    quiz_data = [
+        {'mode': modes[i], 'tts_text': tts[i], 'thai': thai[i], 'meaning': meaning[i],
+         'pronunciation': pron[i], 'category': category[i], 'options': options[i]}
+        for i in range(len(labels))
+    ]
+    return StudySession(labels, quiz_data, was_due.tolist())
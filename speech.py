@@ -0,0 +1,129 @@
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+
+try:  # 有裝 pythainlp 就用它斷詞，沒有的話只用空白切
+    from pythainlp.tokenize import word_tokenize
+except ImportError:
+    word_tokenize = None
+
+# ==========================================
+# 口說評分：泰文正規化 + 字形叢集 (grapheme cluster) 對齊
+# ==========================================
+# 語音辨識的結果跟 TTS_Text 常常只差在看不見的字元、上下標的輸入順序，
+# 直接 fuzz.ratio 會被這些扣分。這裡先正規化，再以「子音 + 上下標」為一個單位
+# 做 Levenshtein 對齊，算出整句分數跟每個詞的分數 (結果畫面標出漏唸的詞)。
+# 每個叢集對應到一個私用區字元，整句變成短字串，rapidfuzz 一次就能算完。
+
+PASS_SCORE = {'Sentence': 70}
+DEFAULT_PASS_SCORE = 80
+MISSED_BELOW = 50  # 詞的分數低於這個就算漏唸
+
+ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad"))
+# 上下標的順序：母音符號 → 聲調 → 其他 (์ ํ 等)，輸入法打的順序不同也會一樣
+MARK_RANK = {c: 0 for c in "ัิีึืฺุู็"}
+MARK_RANK.update({c: 1 for c in "่้๊๋"})
+MARK_RANK.update({c: 2 for c in "์ํ๎"})
+TONE_MARKS = set("่้๊๋")
+
+_MARKS = "".join(MARK_RANK)
+_CLUSTER = re.compile(f"[^{_MARKS}][{_MARKS}]*|[{_MARKS}]+")
+_STACKED = re.compile(f"[^{_MARKS}][{_MARKS}]{{2,}}")  # 兩個以上上下標才需要排序
+_PUNCT = re.compile(r"[^\w\s\u0e00-\u0e7f]")
+
+_CODES = {}     # 叢集 -> 私用區字元 (整個 process 共用)
+_CLUSTERS = []  # 反查：私用區字元的編號 -> 叢集
+_CODES_LOCK = threading.Lock()
+
+
+def normalize_thai(text):
+    text = unicodedata.normalize("NFC", str(text)).translate(ZERO_WIDTH)
+    text = text.replace("ํา", "ำ")   # ํ + า → ำ
+    text = text.replace("เเ", "แ")   # เ + เ → แ
+    text = _PUNCT.sub(" ", text)
+    # 每個子音後面的上下標依固定順序排好
+    text = _STACKED.sub(lambda m: m.group(0)[0] + "".join(sorted(m.group(0)[1:], key=MARK_RANK.get)), text)
+    return " ".join(text.split())
+
+
+def clusters(text):
+    return [c for c in _CLUSTER.findall(text) if not c.isspace()]
+
+
+def _code(cluster):
+    code = _CODES.get(cluster)
+    if code is None:
+        with _CODES_LOCK:
+            code = _CODES.get(cluster)
+            if code is None:
+                code = _CODES[cluster] = chr(0xF0000 + len(_CLUSTERS))
+                _CLUSTERS.append(cluster)
+    return code
+
+
+def encode(cluster_list):
+    # 一個叢集一個字元，Levenshtein 的編輯單位就是一個叢集
+    return "".join(_code(c) for c in cluster_list)
+
+
+def tokenize(text):
+    words = text.split()
+    if word_tokenize is not None:
+        words = [w for word in words for w in word_tokenize(word, keep_whitespace=False)]
+    return words
+
+
+def prepare_target(text):
+    # 目標句子只處理一次：(正規化後的詞, 每個詞的叢集數, 整句編碼)；牌組載入時先算好
+    words = tokenize(normalize_thai(text))
+    per_word = [clusters(w) for w in words]
+    return tuple(words), tuple(len(c) for c in per_word), encode([c for cs in per_word for c in cs])
+
+
+prepare = lru_cache(maxsize=4096)(prepare_target)  # 牌組以外的句子 (例如重算舊紀錄)
+
+
+def _strip_tones(cluster):
+    return "".join(ch for ch in cluster if ch not in TONE_MARKS)
+
+
+def score_speech(spoken, target, category=None, prepared=None):
+    """回傳 {'score', 'is_correct', 'segments': [(詞, 分數)], 'tone_errors'}。prepared：牌組預先算好的 prepare_target。"""
+    words, lengths, target_code = prepared or prepare(str(target).strip())
+    spoken_clusters = clusters(normalize_thai(spoken).replace(" ", ""))
+    spoken_code = encode(spoken_clusters)
+    score = round(fuzz.ratio(spoken_code, target_code))
+
+    # 對齊後，目標的每個叢集有沒有對到 (equal) 就知道每個詞唸了多少
+    hit = [False] * len(target_code)
+    tone_errors = 0
+    for op in Levenshtein.opcodes(target_code, spoken_code):
+        if op.tag == 'equal':
+            hit[op.src_start:op.src_end] = [True] * (op.src_end - op.src_start)
+        elif op.tag == 'replace':
+            for i, j in zip(range(op.src_start, op.src_end), range(op.dest_start, op.dest_end)):
+                t, s = _CLUSTERS[ord(target_code[i]) - 0xF0000], spoken_clusters[j]
+                if _strip_tones(t) == _strip_tones(s):
+                    tone_errors += 1  # 子音母音都對，只差聲調：算半對
+                    hit[i] = 0.5
+
+    segments = []
+    start = 0
+    for word, n in zip(words, lengths):
+        got = sum(hit[start:start + n])
+        segments.append((word, round(100 * got / n) if n else 100))
+        start += n
+
+    pass_score = PASS_SCORE.get(category, DEFAULT_PASS_SCORE)
+    return {'score': score, 'is_correct': score >= pass_score, 'segments': segments, 'tone_errors': tone_errors}
+
+
+def rescore(spoken_texts, target_texts, workers=-1):
+    """重算存下來的作答：兩個等長清單，一次交給 rapidfuzz.process.cpdist 平行算分數。"""
+    spoken = [encode(clusters(normalize_thai(s).replace(" ", ""))) for s in spoken_texts]
+    targets = [prepare(str(t).strip())[2] for t in target_texts]
+    return process.cpdist(spoken, targets, scorer=fuzz.ratio, workers=workers)
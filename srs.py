@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+import numpy as np
+
+# ==========================================
+# 複習間隔規則 + 每日複習量預測
+# ==========================================
+# 答題時用的規則全部集中在 review_outcome()；
+# simulate_workload() 用同一套規則的 NumPy 版本，一次跑幾千次 Monte Carlo，
+# 預測接下來每天會有多少張卡到期，方便先調整公式再改正式的行為。
+
+
+def review_outcome(times, is_correct, mode, today):
+    # 回傳 (新的 Times, 新的 Next)
+    if is_correct:
+        # 手寫比較難，間隔拉得比較慢
+        interval = times + 1 if 'writing' in mode else times * 2 + 1
+        return times + 1, today + timedelta(days=interval)
+    if 'typing' in mode:
+        # 聽寫打錯不扣熟練度，只是今天再考一次
+        return times, today
+    return times - 1, today
+
+
+def review_outcome_np(times, is_correct, is_writing, is_typing):
+    # review_outcome 的向量版，回傳 (新的 Times, 距離今天幾天)
+    interval = np.where(is_writing, times + 1, times * 2 + 1)
+    new_times = np.where(is_correct, times + 1, np.where(is_typing, times, times - 1))
+    new_interval = np.where(is_correct, interval, 0)
+    return new_times, new_interval
+
+
+# build_quiz_data() 的出題模式：依 Times 解鎖，順序跟 possible.append 一樣
+CATEGORY_MODES = {
+    'Char': ['char_pron_to_thai', 'char_thai_to_meaning', 'char_writing_blind', 'char_listening_typing'],
+    'Word': ['word_thai_to_meaning', 'word_listen_to_thai', 'word_writing_copy', 'word_listening_typing'],
+    'Sentence': ['sentence_listen_to_meaning', 'speaking_sentence_text', 'speaking_sentence_shadowing'],
+}
+
+
+def _factorize(values):
+    names, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.astype(np.int32), list(names)
+
+
+def _mode_tables(categories, accuracy, default_accuracy):
+    # 每個 (類別, 模式位置) 的答對率 / 是否手寫 / 是否聽寫
+    width = max(len(m) for m in CATEGORY_MODES.values())
+    acc = np.full((len(categories), width), default_accuracy, dtype=np.float32)
+    writing = np.zeros((len(categories), width), dtype=bool)
+    typing = np.zeros((len(categories), width), dtype=bool)
+    for c, category in enumerate(categories):
+        for m, mode in enumerate(CATEGORY_MODES.get(category, [])):
+            p = accuracy.get((category, mode), accuracy.get(category, default_accuracy))
+            acc[c, m] = p
+            writing[c, m] = 'writing' in mode
+            typing[c, m] = 'typing' in mode
+    return acc, writing, typing
+
+
+def _mode_choices(category_names):
+    # 可選模式數：Char / Word 基本 2 種，Times > 0 加手寫、Times > 3 加聽寫；Sentence 固定 3 種
+    fixed = np.array([3 if c == 'Sentence' else 2 for c in category_names], dtype=np.int8)
+    grows = np.array([c in ('Char', 'Word') for c in category_names])
+    return fixed, grows
+
+
+def assign_modes(categories, times, rng=None):
+    # build_quiz_data() 的 random.choice(possible) 一次做完一整批卡
+    rng = rng or np.random.default_rng()
+    cat_codes, cat_names = _factorize(categories)
+    fixed, grows = _mode_choices(cat_names)
+    times = np.asarray(times)
+    k = fixed[cat_codes] + grows[cat_codes] * ((times > 0).astype(np.int8) + (times > 3))
+    picks = (rng.random(len(times)) * k).astype(np.int64)
+    names = [CATEGORY_MODES.get(c, []) for c in cat_names]
+    return [names[c][m] if m < len(names[c]) else '' for c, m in zip(cat_codes, picks)]
+
+
+def simulate_workload(times, next_days, categories, today, days=30, runs=2000,
+                      accuracy=None, default_accuracy=0.8, max_passes=3, seed=None,
+                      max_cells=4_000_000, max_card_runs=1_000_000, min_runs=20, policy=review_outcome_np):
+    """
+    times / next_days (date.toordinal) / categories：牌組目前的狀態 (陣列)。
+    accuracy：{(類別, 模式): p} 或 {類別: p}。
+    policy：換成別的 review_outcome_np 寫法，就能先看新公式的複習量。
+    回傳每天到期卡數與複習次數的平均、p10、p90，以及實際跑的次數 runs。
+    答錯的卡當天會再出現，最多再考 max_passes - 1 次。
+    runs × 卡片數最多 max_card_runs (大牌組自動少跑幾次，至少 min_runs 次)，時間不會跟著牌組變長。
+    """
+    accuracy = accuracy or {}
+    rng = np.random.default_rng(seed)
+    times = np.asarray(times, dtype=np.int32)
+    n = len(times)
+    runs = max(min(runs, max_card_runs // max(n, 1)), min(runs, min_runs))
+    cat_codes, cat_names = _factorize(categories)
+    acc, writing, typing = _mode_tables(cat_names, accuracy, default_accuracy)
+    fixed, grows = _mode_choices(cat_names)
+    offset = np.maximum(np.asarray(next_days, dtype=np.int32) - int(today), 0)
+
+    k_table = (fixed[:, None] + grows[:, None] * np.array([0, 1, 1, 1, 2], dtype=np.int8)).astype(np.float32)
+    # 小表攤平成一維，迴圈裡只做 take (比二維 fancy index 快很多)
+    width = acc.shape[1]
+    acc, writing, typing = acc.ravel(), writing.ravel(), typing.ravel()
+
+    due = np.zeros((runs, days), dtype=np.int32)
+    reviews = np.zeros((runs, days), dtype=np.int32)
+    # runs 太多的時候分批跑，避免 runs × n 的陣列太大
+    chunk = max(1, min(runs, max_cells // max(n, 1)))
+    for start in range(0, runs, chunk):
+        r = min(chunk, runs - start)
+        t = np.tile(times.astype(np.int16), r)
+        nxt = np.tile(offset.astype(np.int16), r)
+        cat = np.tile(cat_codes.astype(np.int16), r)
+        for d in range(days):
+            todays = np.flatnonzero(nxt <= d)
+            for p in range(max_passes):
+                if not len(todays):
+                    break
+                per_run = np.bincount(todays // n, minlength=r)
+                if p == 0:
+                    due[start:start + r, d] = per_run
+                reviews[start:start + r, d] += per_run
+                tt = t[todays]
+                cc = cat[todays]
+                # 可選模式數 k 跟 (類別, Times) 有關，先查表
+                k = k_table[cc, np.clip(tt, 0, 4)]
+                # 同一個亂數：整數部分選模式，小數部分決定答對與否
+                u = rng.random(len(todays), dtype=np.float32) * k
+                mode = u.astype(np.int16)
+                kind = cc * width + mode
+                correct = (u - mode) < acc[kind]
+                new_t, interval = policy(tt, correct, writing[kind], typing[kind])
+                t[todays] = new_t
+                nxt[todays] = interval + d
+                # 答錯 (或間隔 <= 0) 的當天再考一次
+                todays = todays[interval <= 0]
+    return {
+        "due_mean": due.mean(axis=0),
+        "due_p10": np.percentile(due, 10, axis=0),
+        "due_p90": np.percentile(due, 90, axis=0),
+        "reviews_mean": reviews.mean(axis=0),
+        "runs": runs,
+    }
+
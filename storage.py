@@ -0,0 +1,444 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 儲存後端 (Google Sheets / 本地 SQLite)
+# ==========================================
+# App 只透過這幾個方法存取資料：
+#   revision()              目前遠端版本 (拿不到回傳 None)
+#   load()                  讀整副牌 (已清理，index = 卡片 id)
+#   apply_reviews(deltas)   寫回作答結果 {id: {'Times': int, 'Next': 'YYYY-MM-DD', 'Updated': ms}}
+#                           只寫比遠端新的列，回傳遠端比較新、沒有寫入的 {id: 遠端的值}
+#   changes_since(rev, known)  從某個版本之後變動過的列
+#   write_all(df)           整副牌寫回
+#
+# 卡片 id 是 Sheet 上的 ID 欄 (第一次讀的時候自動補上)，不是第幾列：
+# 有人排序、插入或刪除列，還沒送出的作答也會寫回同一張卡。
+#
+# 多裝置同步：每一列的 Updated 是最後一次作答的時間 (epoch ms)，當作這一列的版本。
+# 同一列兩邊都有作答時，Updated 比較新的贏 (version_key)；所以兩台裝置怎麼交錯同步，結果都一樣。
+
+TEXT_COLS = ['Thai', 'TTS_Text', 'Pronunciation', 'Meaning', 'Category']
+VERSION_COL = 'Updated'
+ID_COL = 'ID'  # 每張卡固定的 ID (= DataFrame index)；Sheet 排序、插入列也不會變
+REQUIRED_COLS = TEXT_COLS + ['Times', 'Next', VERSION_COL]
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def version_key(delta):
+    # 先比作答時間；同一毫秒的話再比 Times / Next，讓兩邊選出同一個贏家
+    return (int(delta.get(VERSION_COL) or 0), int(delta['Times']), str(delta['Next'])[:10])
+
+
+def _to_int(value, default=0):
+    # Sheet 儲存格讀回來的值 (可能有防護用的單引號、可能是空的) → int
+    number = pd.to_numeric(str(value).removeprefix("'"), errors='coerce')
+    return default if pd.isna(number) else int(number)
+
+
+def _sheet_date(value):
+    # UNFORMATTED_VALUE 讀回來的日期是序號 (1899-12-30 起算的天數)；當文字存的可能是各種寫法。
+    # 一律回傳 'YYYY-MM-DD'，讀不懂 (空白、亂打) 回傳 None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (date(1899, 12, 30) + timedelta(days=int(value))).isoformat()
+    parsed = pd.to_datetime(str(value).removeprefix("'").strip(), errors='coerce')
+    return None if pd.isna(parsed) else parsed.date().isoformat()
+
+
+def assign_ids(ids):
+    # 空白或重複的 ID 補新的 (目前最大值 + 1 往上)；整欄都沒有的舊表格，ID = 原本的列位置 (0 起算)
+    ids = pd.to_numeric(pd.Series(ids, dtype=object).astype(str).str.removeprefix("'"), errors='coerce')
+    if ids.isna().all():
+        return np.arange(len(ids), dtype=np.int64)
+    ids = ids.mask(ids.duplicated())
+    missing = ids.isna().to_numpy()
+    out = ids.fillna(0).to_numpy(dtype=np.int64, copy=True)
+    out[missing] = int(ids.max()) + 1 + np.arange(missing.sum())
+    return out
+
+
+def clean_data(df):
+    df.columns = df.columns.str.strip()
+    for col in REQUIRED_COLS:
+        if col not in df.columns:
+            if col in ('Times', VERSION_COL): df[col] = 0
+            elif col == 'Next': df[col] = datetime.now().date()
+            else: df[col] = ""
+
+    for col in TEXT_COLS:
+        # 1. 確保是文字格式且沒有 nan
+        df[col] = df[col].fillna("").astype(str).replace(["nan", "None", "<NA>"], "")
+        # 2. 【脫掉防護衣】如果讀取進來的字串開頭有單引號，把它拿掉，才不會影響畫面顯示
+        df[col] = df[col].str.removeprefix("'")
+
+    df['Times'] = pd.to_numeric(df['Times'], errors='coerce').fillna(0).astype(int)
+    df['Next'] = pd.to_datetime(df['Next'], errors='coerce').fillna(pd.Timestamp.now()).dt.date
+    df[VERSION_COL] = pd.to_numeric(df[VERSION_COL].astype(str).str.removeprefix("'"), errors='coerce').fillna(0).astype('int64')
+
+    # index = 卡片 ID：有 ID 欄就用它，沒有的話 (SQLite、快照、舊表格) 就是原本的 index
+    ids = df[ID_COL] if ID_COL in df.columns else pd.Series(df.index, index=df.index, dtype=object)
+    df.index = assign_ids(ids.to_numpy())
+    df = df.drop(columns=[ID_COL], errors='ignore')
+
+    return df[df['Thai'].str.strip() != ""]
+
+
+class GSheetsStorage:
+    name = "gsheets"
+
+    def __init__(self, conn, worksheet="Sheet1", settings=None):
+        # settings：st.connection("gsheets") 用的那份設定 (secrets 的 [connections.gsheets])，
+        # 有 service account 才能只寫單一儲存格；沒有的話只能整張讀寫
+        self.conn = conn
+        self.worksheet = worksheet
+        self.settings = dict(settings or {})
+        self._handle = None
+        self._rows = {}  # 卡片 ID -> Sheet 的第幾列 (讀 ID 欄建立，對不上時重建)
+
+    def _spreadsheet(self):
+        if self._handle is None:
+            import gspread
+            settings = dict(self.settings)
+            spreadsheet = settings.pop('spreadsheet', None)
+            settings.pop('worksheet', None)
+            if settings.get('type') != 'service_account' or not spreadsheet:
+                raise RuntimeError("沒有 service account 設定，不能只寫單一儲存格")
+            client = gspread.service_account_from_dict(settings)
+            if str(spreadsheet).startswith("http"):
+                self._handle = client.open_by_url(spreadsheet)
+            else:
+                self._handle = client.open(spreadsheet)
+        return self._handle
+
+    def revision(self):
+        # 用 Sheet 的最後修改時間當版本
+        try:
+            spreadsheet = self._spreadsheet()
+            if hasattr(spreadsheet, 'get_lastUpdateTime'):  # gspread >= 6
+                return str(spreadsheet.get_lastUpdateTime())
+            return str(spreadsheet.lastUpdateTime)
+        except Exception:
+            return None
+
+    def load(self):
+        worksheet, cols = self._worksheet()
+        if worksheet is not None:
+            self._ensure_ids(worksheet, cols)
+        return clean_data(self.conn.read(worksheet=self.worksheet, ttl=0))
+
+    def write_all(self, df):
+        save_df = df.copy()
+        save_df['Next'] = pd.to_datetime(save_df['Next']).dt.strftime('%Y-%m-%d')
+
+        # 【穿上防護衣】在寫入 Google Sheets 之前，強制在文字前面加上單引號 (')
+        # 這會阻止 Google Sheets 把泰文數字轉換成阿拉伯數字
+        for col in TEXT_COLS:
+            if col in save_df.columns:
+                text = save_df[col].astype(str)
+                save_df[col] = text.where(text.str.startswith("'"), "'" + text)
+        # Updated 是 13 位數的毫秒，也當文字存，不然會被顯示成 1.7E+12
+        if VERSION_COL in save_df.columns:
+            save_df[VERSION_COL] = "'" + save_df[VERSION_COL].fillna(0).astype('int64').astype(str)
+        save_df[ID_COL] = save_df.index.astype('int64')
+
+        self.conn.update(worksheet=self.worksheet, data=save_df)
+        self._rows = {}
+
+    # --- 單一儲存格讀寫 (service account) ---
+    def _worksheet(self):
+        # 回傳 (worksheet, 欄位名稱 → 欄號)；拿不到 gspread 物件時回傳 (None, {})
+        try:
+            worksheet = self._spreadsheet().worksheet(self.worksheet)
+            header = [h.strip() for h in worksheet.row_values(1)]
+        except Exception:
+            return None, {}
+        if 'Times' in header and 'Next' in header:
+            # 舊的表格還沒有 Updated / ID 欄：加在最後面 (舊資料的版本當 0，ID 由 _ensure_ids 補)
+            for name in (VERSION_COL, ID_COL):
+                if name not in header:
+                    if worksheet.col_count < len(header) + 1:
+                        worksheet.add_cols(1)
+                    worksheet.update_cell(1, len(header) + 1, name)
+                    header.append(name)
+        return worksheet, {name: i + 1 for i, name in enumerate(header)}
+
+    @staticmethod
+    def _column_range(col, rows=None):
+        # 第 col 欄從第 2 列 (標題下面) 開始；rows 給了就只到第 rows + 1 列
+        from gspread.utils import rowcol_to_a1
+        letter = rowcol_to_a1(1, col)[:-1]
+        return f"{letter}2:{letter}{rows + 1 if rows is not None else ''}"
+
+    @staticmethod
+    def _get(worksheet, ranges):
+        # 讀原始值 (數字就是數字、日期是序號)，不受試算表的地區格式影響
+        return worksheet.batch_get(ranges, value_render_option='UNFORMATTED_VALUE',
+                                   date_time_render_option='SERIAL_NUMBER')
+
+    def _ensure_ids(self, worksheet, cols):
+        # 每一列一個固定的 ID：排序、插入、刪除列之後，作答還是寫回同一張卡
+        thai, ids = self._get(worksheet, [self._column_range(cols['Thai']), self._column_range(cols[ID_COL])])
+        raw = [row[0] if row else "" for row in ids][:len(thai)]
+        raw += [""] * (len(thai) - len(raw))
+        filled = assign_ids(pd.Series(raw, dtype=object))
+        if any(_to_int(v, None) != f for v, f in zip(raw, filled)):
+            worksheet.batch_update([{'range': self._column_range(cols[ID_COL], len(filled)),
+                                     'values': [[int(v)] for v in filled]}], value_input_option='RAW')
+        self._rows = {int(v): i + 2 for i, v in enumerate(filled)}
+
+    def _locate(self, worksheet, cols):
+        ids = self._get(worksheet, [self._column_range(cols[ID_COL])])[0]
+        self._rows = {}
+        for i, row in enumerate(ids):
+            card = _to_int(row[0], None) if row else None
+            if card is not None:
+                self._rows.setdefault(card, i + 2)
+
+    def _read_rows(self, worksheet, cols, ids):
+        # 一次 batch_get 讀回這些卡的 ID / Times / Next / Updated；ID 對不上 (有人排序或插入列) 就重讀 ID 欄再試一次
+        from gspread.utils import rowcol_to_a1
+        names = [ID_COL, 'Times', 'Next', VERSION_COL]
+        for attempt in range(2):
+            if attempt or not self._rows:
+                self._locate(worksheet, cols)
+            found = [card for card in ids if card in self._rows]
+            values = self._get(worksheet, [rowcol_to_a1(self._rows[card], cols[name])
+                                           for card in found for name in names]) if found else []
+            out, moved = {}, False
+            for i, card in enumerate(found):
+                raw = [c[0][0] if c and c[0] else "" for c in values[i * 4:i * 4 + 4]]
+                if _to_int(raw[0], None) != card:
+                    moved = True
+                    break
+                out[card] = {'row': self._rows[card], 'Times': _to_int(raw[1]),
+                             'Next': _sheet_date(raw[2]), VERSION_COL: _to_int(raw[3])}
+            if not moved:
+                return out
+        return out
+
+    def apply_reviews(self, deltas):
+        # 先讀回遠端這幾張卡的版本，只寫比較新的；遠端比較新的卡原封不動回傳給呼叫端
+        if not deltas:
+            return {}
+        from gspread.utils import rowcol_to_a1
+        worksheet, cols = self._worksheet()
+
+        if worksheet is not None and {'Times', 'Next', VERSION_COL, ID_COL} <= cols.keys():
+            remote = self._read_rows(worksheet, cols, sorted(deltas))
+            updates, rejected = [], {}
+            for card, delta in deltas.items():
+                current = remote.get(card)
+                if current is None:
+                    continue  # 這張卡已經從 Sheet 刪掉了
+                sheet_row = current.pop('row')
+                # 遠端 Next 讀不懂的列直接用我們的值修好
+                if current['Next'] is not None and version_key(delta) <= version_key(current):
+                    rejected[card] = current
+                    continue
+                updates.append({'range': rowcol_to_a1(sheet_row, cols['Times']), 'values': [[delta['Times']]]})
+                updates.append({'range': rowcol_to_a1(sheet_row, cols['Next']), 'values': [[delta['Next']]]})
+                updates.append({'range': rowcol_to_a1(sheet_row, cols[VERSION_COL]),
+                                'values': [[f"'{int(delta.get(VERSION_COL) or 0)}"]]})
+            if updates:
+                worksheet.batch_update(updates, value_input_option='USER_ENTERED')
+            return rejected
+
+        # 退路 (例如拿不到 gspread 物件)：讀整張表、合併、整張寫回
+        full = self.load()
+        rejected = {}
+        for card, delta in deltas.items():
+            if card not in full.index:
+                continue
+            current = {'Times': int(full.at[card, 'Times']), 'Next': str(full.at[card, 'Next']),
+                       VERSION_COL: int(full.at[card, VERSION_COL])}
+            if version_key(delta) <= version_key(current):
+                rejected[card] = current
+                continue
+            full.at[card, 'Times'] = delta['Times']
+            full.at[card, 'Next'] = date.fromisoformat(str(delta['Next'])[:10])
+            full.at[card, VERSION_COL] = int(delta.get(VERSION_COL) or 0)
+        self.write_all(full)
+        return rejected
+
+    def changes_since(self, revision, known=None):
+        # Sheet 沒有逐列的版本號，但有 Updated 欄：只讀 ID / Updated 兩欄跟本地比，
+        # 再用 batch_get 拿比較新的那幾張卡。known = 本地每張卡的 Updated (Series，index = 卡片 ID)
+        empty = pd.DataFrame(columns=['Times', 'Next', VERSION_COL])
+        if revision is not None and revision == self.revision():
+            return empty
+        worksheet, cols = self._worksheet()
+        if worksheet is None or known is None or not {VERSION_COL, ID_COL} <= cols.keys():
+            return self.load()
+        ids, updated = self._get(worksheet, [self._column_range(cols[ID_COL]), self._column_range(cols[VERSION_COL])])
+        updated = [row[0] if row else "" for row in updated]
+        remote = {}
+        for i, row in enumerate(ids):
+            card = _to_int(row[0], None) if row else None
+            if card is not None:
+                remote[card] = _to_int(updated[i]) if i < len(updated) else 0
+        remote = pd.Series(remote, dtype='int64')
+        local = known.reindex(remote.index).fillna(0)
+        cards = remote.index[remote.to_numpy() > local.to_numpy()].tolist()
+        if not cards:
+            return empty
+        rows = {card: row for card, row in self._read_rows(worksheet, cols, cards).items() if row['Next'] is not None}
+        if not rows:
+            return empty
+        changed = pd.DataFrame.from_dict(rows, orient='index')
+        changed['Next'] = pd.to_datetime(changed['Next']).dt.date
+        return changed[['Times', 'Next', VERSION_COL]]
+
+
+class SQLiteStorage:
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cards (
+        id INTEGER PRIMARY KEY,
+        thai TEXT NOT NULL,
+        tts_text TEXT NOT NULL DEFAULT '',
+        pronunciation TEXT NOT NULL DEFAULT '',
+        meaning TEXT NOT NULL DEFAULT '',
+        category TEXT NOT NULL DEFAULT '',
+        times INTEGER NOT NULL DEFAULT 0,
+        next TEXT NOT NULL,
+        rev INTEGER NOT NULL DEFAULT 0,
+        updated INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS cards_next ON cards(next);
+    CREATE INDEX IF NOT EXISTS cards_rev ON cards(rev);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    COLUMNS = {
+        'Thai': 'thai', 'TTS_Text': 'tts_text', 'Pronunciation': 'pronunciation',
+        'Meaning': 'meaning', 'Category': 'category', 'Times': 'times', 'Next': 'next',
+        'Updated': 'updated',
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+            # 舊的資料庫沒有 updated 欄
+            if 'updated' not in {row[1] for row in db.execute("PRAGMA table_info(cards)")}:
+                db.execute("ALTER TABLE cards ADD COLUMN updated INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        # 每個執行緒一條連線 (背景同步執行緒也會用到)
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # --- meta ---
+    def _get_meta(self, db, key, default=None):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _bump_revision(self, db):
+        rev = int(self._get_meta(db, 'revision', 0)) + 1
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (str(rev),))
+        return rev
+
+    def revision(self):
+        return int(self._get_meta(self._connect(), 'revision', 0))
+
+    def is_empty(self):
+        return self._connect().execute("SELECT 1 FROM cards LIMIT 1").fetchone() is None
+
+    # --- 讀寫 ---
+    def _frame(self, sql, params=()):
+        cols = ", ".join(self.COLUMNS.values())
+        df = pd.read_sql_query(f"SELECT id, {cols} FROM cards {sql}", self._connect(), params=params, index_col='id')
+        df = df.rename(columns={v: k for k, v in self.COLUMNS.items()})
+        df.index.name = None
+        df['Next'] = pd.to_datetime(df['Next']).dt.date
+        return df
+
+    def load(self):
+        return self._frame("ORDER BY id")
+
+    def write_all(self, df):
+        rows = [
+            (int(i), r.Thai, r.TTS_Text, r.Pronunciation, r.Meaning, r.Category, int(r.Times), str(r.Next)[:10],
+             int(r.Updated))
+            for i, r in zip(df.index, df[REQUIRED_COLS].itertuples(index=False))
+        ]
+        with self._connect() as db:
+            rev = self._bump_revision(db)
+            db.execute("DELETE FROM cards")
+            db.executemany(
+                "INSERT INTO cards (id, thai, tts_text, pronunciation, meaning, category, times, next, updated, rev)"
+                f" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {rev})", rows)
+
+    def apply_reviews(self, deltas):
+        # 一個 transaction，只更新有作答、而且比資料庫裡新的列
+        if not deltas:
+            return {}
+        with self._connect() as db:
+            marks = ", ".join("?" * len(deltas))
+            current = {
+                row: {'Times': times, 'Next': next_date, VERSION_COL: updated}
+                for row, times, next_date, updated in db.execute(
+                    f"SELECT id, times, next, updated FROM cards WHERE id IN ({marks})", [int(r) for r in deltas])
+            }
+            rejected = {row: current[row] for row, d in deltas.items()
+                        if row in current and version_key(d) <= version_key(current[row])}
+            accepted = [(int(d['Times']), str(d['Next'])[:10], int(d.get(VERSION_COL) or 0), int(row))
+                        for row, d in deltas.items() if row in current and row not in rejected]
+            if accepted:
+                rev = self._bump_revision(db)
+                db.executemany("UPDATE cards SET times = ?, next = ?, updated = ?, rev = ? WHERE id = ?",
+                               [a[:3] + (rev,) + a[3:] for a in accepted])
+        return rejected
+
+    def changes_since(self, revision, known=None):
+        return self._frame("WHERE rev > ? ORDER BY id", (int(revision or 0),))
+
+    def due(self, today=None, limit=None):
+        # 用 next 的索引直接查到期的卡
+        today = (today or date.today()).isoformat()
+        sql = "WHERE next <= ? ORDER BY next"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._frame(sql, (today,))
+
+    # --- 跟 Google Sheet 雙向同步 ---
+    def sync_to(self, other):
+        # 1. 上次同步之後本地有變動的列送過去；對方比較新的列直接收下
+        # 2. 再拉對方 Updated 比本地新的列，一樣 newer-wins 寫進來
+        # 回傳 (送出的列數, 收下的列數)
+        db = self._connect()
+        since = int(self._get_meta(db, 'synced_revision', 0))
+        changed = self.changes_since(since)
+        rejected = {}
+        if not changed.empty:
+            rejected = other.apply_reviews({
+                int(i): {'Times': int(t), 'Next': str(n)[:10], VERSION_COL: int(u)}
+                for i, t, n, u in zip(changed.index, changed['Times'], changed['Next'], changed[VERSION_COL])
+            }) or {}
+        known = self.load()[VERSION_COL]
+        remote = other.changes_since(None, known=known)
+        incoming = dict(rejected)
+        for i, t, n, u in zip(remote.index, remote['Times'], remote['Next'], remote[VERSION_COL]):
+            incoming[int(i)] = {'Times': int(t), 'Next': str(n)[:10], VERSION_COL: int(u)}
+        stale = self.apply_reviews(incoming)
+        with db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_revision', ?)",
+                       (str(self.revision()),))
+        return len(changed) - len(rejected), len(incoming) - len(stale)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 測試直接 import 專案根目錄的模組 (跟 bench 一樣)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
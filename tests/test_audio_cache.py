@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+from audio_cache import AudioCache, FakeTTSBackend, audio_key
+
+
+def get(cache, text):
+    return asyncio.run(cache.get(text))
+
+
+def disk_files(cache_dir):
+    return sorted(name for _, _, files in os.walk(cache_dir) for name in files if name.endswith(".mp3"))
+
+
+def test_second_get_is_a_memory_hit():
+    backend = FakeTTSBackend()
+    cache = AudioCache(backend=backend)
+    first = get(cache, "สวัสดี")
+    assert first and get(cache, "สวัสดี") == first
+    assert backend.calls == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"], stats["disk_hits"]) == (1, 1, 0)
+
+
+def test_voice_is_part_of_the_key():
+    backend = FakeTTSBackend()
+    cache = AudioCache(backend=backend)
+    asyncio.run(cache.get("ก", voice="a"))
+    asyncio.run(cache.get("ก", voice="b"))
+    assert backend.calls == 2
+    assert audio_key("ก", "a") != audio_key("ก", "b")
+
+
+def test_new_process_reads_from_disk(tmp_path):
+    data = get(AudioCache(backend=FakeTTSBackend(), cache_dir=str(tmp_path)), "ขอบคุณ")
+
+    backend = FakeTTSBackend()
+    cache = AudioCache(backend=backend, cache_dir=str(tmp_path))
+    assert cache.contains("ขอบคุณ")
+    assert get(cache, "ขอบคุณ") == data
+    assert get(cache, "ขอบคุณ") == data
+    assert backend.calls == 0
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_memory_evicts_least_recently_used():
+    size = len(asyncio.run(FakeTTSBackend().synthesize("a", "v")))
+    backend = FakeTTSBackend()
+    cache = AudioCache(backend=backend, max_memory_bytes=2 * size, voice="v")
+    get(cache, "a")
+    get(cache, "b")
+    get(cache, "a")  # a 變成最近用過的
+    get(cache, "c")  # 擠掉 b
+    assert cache.stats()["memory_items"] == 2
+    assert cache.get_cached("a") is not None
+    assert cache.get_cached("b") is None
+    assert cache.stats()["memory_bytes"] <= 2 * size
+
+
+def test_disk_evicts_oldest_files(tmp_path):
+    size = len(asyncio.run(FakeTTSBackend().synthesize("a", "v")))
+    cache = AudioCache(backend=FakeTTSBackend(), cache_dir=str(tmp_path), max_disk_bytes=2 * size, voice="v")
+    for i, text in enumerate("abc"):
+        get(cache, text)
+        path = cache._path(audio_key(text, "v"))
+        os.utime(path, (1000 + i, 1000 + i))  # 檔案時間分開，淘汰順序才固定
+    get(cache, "d")
+    remaining = disk_files(tmp_path)
+    assert len(remaining) == 2
+    assert audio_key("a", "v") + ".mp3" not in remaining
+    assert audio_key("d", "v") + ".mp3" in remaining
+    assert cache.stats()["disk_bytes"] <= 2 * size
+
+
+def test_overwriting_a_file_does_not_grow_disk_size(tmp_path):
+    cache = AudioCache(backend=FakeTTSBackend(), cache_dir=str(tmp_path), voice="v")
+    data = get(cache, "a")
+    key = audio_key("a", "v")
+    for _ in range(3):
+        cache._disk_put(key, data)
+    assert cache.stats()["disk_bytes"] == len(data)
+    assert len(disk_files(tmp_path)) == 1
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+import handwriting
+
+# Pillow 內建的 Aileron (只有拉丁字母) 寫成檔案當標準答案的字型，不用裝泰文字型也能測
+WRONG_PAIRS = [("ABC", "ABD"), ("word", "ward"), ("abcd", "abce"), ("B", "8"), ("8", "B"),
+               ("hello", "hallo"), ("E", "F"), ("mn", "nm"), ("P", "R")]
+WORDS = ["ABC", "word", "abcd", "B", "8", "hello", "xyz", "mn"]
+
+
+@pytest.fixture(scope="module")
+def font_path(tmp_path_factory):
+    font = ImageFont.load_default(size=10)
+    if not isinstance(font, ImageFont.FreeTypeFont):
+        pytest.skip("Pillow 沒有 FreeType")
+    path = tmp_path_factory.mktemp("fonts") / "aileron.ttf"
+    path.write_bytes(font.path.getvalue())
+    return str(path)
+
+
+def canvas(text, font_path, angle=0, thicken=0, size=150):
+    # 跟 st_canvas 一樣：深色底、白色筆跡、RGBA
+    font = ImageFont.truetype(font_path, size)
+    left, top, right, bottom = font.getbbox(text)
+    img = Image.new("L", (right - left + 40, bottom - top + 40), 0)
+    ImageDraw.Draw(img).text((20 - left, 20 - top), text, font=font, fill=255)
+    if thicken:
+        img = img.filter(ImageFilter.MaxFilter(thicken))
+    ink = np.asarray(img.rotate(angle, expand=True))
+    rgba = np.zeros(ink.shape + (4,), dtype=np.uint8)
+    rgba[..., 0], rgba[..., 1], rgba[..., 2] = 44, 62, 80
+    rgba[ink > 127, :3] = 255
+    rgba[..., 3] = 255
+    return rgba
+
+
+@pytest.mark.parametrize("text", WORDS)
+def test_same_text_passes(font_path, text):
+    grade = handwriting.score_handwriting(canvas(text, font_path), text, font_path)
+    assert grade['is_correct'], grade
+
+
+@pytest.mark.parametrize("text", ["ABC", "word", "B"])
+def test_small_slant_and_thicker_strokes_pass(font_path, text):
+    grade = handwriting.score_handwriting(canvas(text, font_path, angle=3, thicken=3), text, font_path)
+    assert grade['is_correct'], grade
+
+
+@pytest.mark.parametrize("target,written", WRONG_PAIRS)
+def test_wrong_letter_fails(font_path, target, written):
+    grade = handwriting.score_handwriting(canvas(written, font_path), target, font_path)
+    assert not grade['is_correct'], grade
+    assert grade['score'] < handwriting.PASS_SCORE
+
+
+def test_missing_letter_fails(font_path):
+    grade = handwriting.score_handwriting(canvas("wrd", font_path), "word", font_path)
+    assert not grade['is_correct'], grade
+
+
+def test_empty_canvas_and_missing_font_return_none(font_path, monkeypatch):
+    blank = np.zeros((300, 700, 4), dtype=np.uint8)
+    blank[..., 3] = 255
+    assert handwriting.score_handwriting(blank, "ABC", font_path) is None
+    assert handwriting.score_handwriting(None, "ABC", font_path) is None
+    monkeypatch.setattr(handwriting, "find_font", lambda: None)
+    assert handwriting.score_handwriting(canvas("ABC", font_path), "ABC") is None
+
+
+def test_columns_follow_character_advances(font_path):
+    _, _, cols, edges = handwriting.target_glyph("abcd", font_path)
+    assert len(edges) == 3
+    assert set(np.unique(cols)) == {0, 1, 2, 3}
@@ -0,0 +1,77 @@
+import time
+
+from review_log import ReviewJournal
+
+
+class Sink:
+    def __init__(self, rejected=None, fail=False):
+        self.batches = []
+        self.rejected = rejected or {}
+        self.fail = fail
+
+    def __call__(self, deltas):
+        if self.fail:
+            raise ConnectionError("offline")
+        self.batches.append(deltas)
+        return {row: self.rejected[row] for row in deltas if row in self.rejected}
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_flush_merges_answers_per_row():
+    sink = Sink()
+    journal = ReviewJournal(sink, flush_interval=60)
+    journal.record(1, 1, "2030-01-01", updated=10)
+    journal.record(1, 2, "2030-01-02", updated=20)
+    journal.record(2, 1, "2030-01-03", updated=30)
+    assert journal.flush() == 2
+    assert sink.batches == [{1: {'Times': 2, 'Next': "2030-01-02", 'Updated': 20},
+                             2: {'Times': 1, 'Next': "2030-01-03", 'Updated': 30}}]
+    assert journal.pending() == {}
+    journal.close()
+
+
+def test_rejected_rows_are_handed_back_once():
+    remote = {'Times': 9, 'Next': "2031-01-01", 'Updated': 99}
+    journal = ReviewJournal(Sink(rejected={1: remote}), flush_interval=60)
+    journal.record_many({1: (1, "2030-01-01", 10), 2: (1, "2030-01-01", 10)})
+    journal.flush()
+    assert journal.take_rejected() == {1: remote}
+    assert journal.take_rejected() == {}
+    journal.close()
+
+
+def test_failed_flush_keeps_pending_rows():
+    sink = Sink(fail=True)
+    journal = ReviewJournal(sink, flush_interval=60)
+    journal.record(1, 1, "2030-01-01", updated=10)
+    assert journal.flush() == 0
+    assert journal.stats()["last_error"].startswith("ConnectionError")
+    assert 1 in journal.pending()
+    sink.fail = False
+    assert journal.flush() == 1
+    assert journal.stats()["last_error"] is None
+    journal.close()
+
+
+def test_replayed_entries_are_sent_without_a_new_answer(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    offline = ReviewJournal(Sink(fail=True), path=path, flush_interval=60)
+    offline.record(3, 2, "2030-01-01", updated=10)
+    offline.flush()
+
+    # 重開：沒有新的作答，背景執行緒也要把上次的送出去
+    sink = Sink()
+    journal = ReviewJournal(sink, path=path, flush_interval=0.05)
+    assert wait_for(lambda: sink.batches)
+    assert sink.batches[0] == {3: {'Times': 2, 'Next': "2030-01-01", 'Updated': 10}}
+    assert wait_for(lambda: not journal.pending())
+    journal.close()
+    assert ReviewJournal(Sink(), path=path).pending() == {}
@@ -0,0 +1,94 @@
+import random
+from array import array
+from collections import Counter
+from datetime import date
+
+import numpy as np
+import pytest
+
+from scheduler import DueScheduler
+
+TODAY = date(2024, 6, 1).toordinal()
+
+
+def make(n=50, weighting=None, seed=0):
+    rng = random.Random(seed)
+    ids = [f"c{i}" for i in range(n)]
+    times = array('i', (rng.randint(0, 6) for _ in range(n)))
+    next_days = array('i', (TODAY + rng.randint(-10, 5) for _ in range(n)))
+    return DueScheduler(ids, times, next_days, TODAY, weighting, random.Random(seed))
+
+
+def due_cards(s):
+    return {s._all[i] for i in np.flatnonzero(np.asarray(s._next) <= s.today)}
+
+
+def check_invariants(s):
+    # pool 剛好是到期的卡，pool_pos 跟 pool 互相對應，權重樹跟每張卡的權重一致
+    pool = list(s._pool)
+    assert {s._all[p] for p in pool} == due_cards(s)
+    assert len(set(pool)) == len(pool)
+    for slot, pos in enumerate(pool):
+        assert s._pool_pos[pos] == slot
+    assert (s._pool_pos >= 0).sum() == len(pool)
+    if s._tree is not None:
+        for slot, pos in enumerate(pool):
+            assert s._tree.get(slot) == pytest.approx(s._weight(pos))
+        assert s._tree.total() == pytest.approx(sum(s._weight(p) for p in pool))
+
+
+@pytest.mark.parametrize("weighting", [None, 'overdue', 'low_times'])
+def test_random_updates_keep_pool_consistent(weighting):
+    s = make(weighting=weighting)
+    rng = random.Random(1)
+    check_invariants(s)
+    for _ in range(300):
+        card = f"c{rng.randrange(50)}"
+        s.update(card, rng.randint(0, 6), TODAY + rng.randint(-3, 3))
+        check_invariants(s)
+    s.set_today(TODAY + 2)
+    check_invariants(s)
+    s.set_today(TODAY)  # 時間倒退：整個重建
+    check_invariants(s)
+
+
+@pytest.mark.parametrize("weighting", [None, 'overdue', 'low_times'])
+def test_pick_due_returns_due_cards_and_honours_exclude(weighting):
+    s = make(weighting=weighting)
+    due = due_cards(s)
+    for _ in range(500):
+        card = s.pick_due()
+        assert card in due
+        assert s.pick_due(exclude=card) != card
+
+
+def test_pick_due_with_one_or_no_card():
+    s = make(n=3)
+    for card in ("c0", "c1", "c2"):
+        s.update(card, 1, TODAY + 1)
+    assert s.pick_due() is None and s.due_count() == 0
+    s.update("c1", 0, TODAY)
+    assert s.pick_due() == "c1" and s.pick_due(exclude="c1") == "c1"
+
+
+def test_answered_card_leaves_the_pool_and_new_day_brings_it_back():
+    s = make()
+    card = s.pick_due()
+    s.update(card, 3, TODAY + 1)
+    assert not s.is_due(card)
+    s.set_today(TODAY + 1)
+    assert s.is_due(card)
+
+
+def test_overdue_weighting_prefers_older_cards():
+    ids = ["old", "new"]
+    s = DueScheduler(ids, array('i', [0, 0]), array('i', [TODAY - 9, TODAY]), TODAY, 'overdue', random.Random(0))
+    counts = Counter(s.pick_due() for _ in range(2000))
+    # 權重 10 : 1
+    assert counts["old"] / 2000 == pytest.approx(10 / 11, abs=0.03)
+
+
+def test_pick_any_skips_excluded():
+    s = make(n=5)
+    assert all(s.pick_any(exclude="c2") != "c2" for _ in range(200))
+    assert set(s.pick_any() for _ in range(500)) == {f"c{i}" for i in range(5)}
@@ -0,0 +1,146 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from bench import fakes
+from storage import GSheetsStorage, SQLiteStorage, VERSION_COL, clean_data, version_key
+
+
+def deck(n=5):
+    return clean_data(fakes.make_deck(n, seed=1))
+
+
+def delta(times, next_date, updated):
+    return {'Times': times, 'Next': next_date, VERSION_COL: updated}
+
+
+@pytest.fixture
+def sqlite(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "local.db"))
+    store.write_all(deck())
+    return store
+
+
+# --- version_key ---
+def test_version_key_prefers_later_update_then_times():
+    assert version_key(delta(0, "2024-01-01", 2)) > version_key(delta(9, "2030-01-01", 1))
+    assert version_key(delta(2, "2024-01-01", 1)) > version_key(delta(1, "2024-01-01", 1))
+    assert version_key({'Times': 1, 'Next': "2024-01-01"}) == version_key(delta(1, "2024-01-01", 0))
+
+
+# --- SQLite ---
+def test_sqlite_apply_reviews_newer_wins(sqlite):
+    assert sqlite.apply_reviews({0: delta(3, "2030-01-01", 100)}) == {}
+    # 比較舊的作答不寫，回傳資料庫裡的值
+    rejected = sqlite.apply_reviews({0: delta(1, "2020-01-01", 50), 1: delta(4, "2031-01-01", 200)})
+    assert rejected == {0: delta(3, "2030-01-01", 100)}
+    df = sqlite.load()
+    assert (df.at[0, 'Times'], df.at[0, 'Next'], df.at[0, VERSION_COL]) == (3, date(2030, 1, 1), 100)
+    assert (df.at[1, 'Times'], df.at[1, VERSION_COL]) == (4, 200)
+
+
+def test_sqlite_revision_only_moves_on_accepted_rows(sqlite):
+    sqlite.apply_reviews({0: delta(3, "2030-01-01", 100)})
+    rev = sqlite.revision()
+    assert sqlite.apply_reviews({0: delta(1, "2020-01-01", 50)}) == {0: delta(3, "2030-01-01", 100)}
+    assert sqlite.apply_reviews({999: delta(1, "2020-01-01", 500)}) == {}  # 不存在的卡
+    assert sqlite.revision() == rev
+    assert sqlite.changes_since(rev - 1).index.tolist() == [0]
+    assert sqlite.changes_since(rev).empty
+
+
+def test_sqlite_sync_to_is_two_way_and_converges(sqlite, tmp_path):
+    other = SQLiteStorage(str(tmp_path / "other.db"))
+    other.write_all(deck())
+    sqlite.sync_to(other)  # 第一次：兩邊一樣，沒有東西要送
+
+    sqlite.apply_reviews({0: delta(2, "2030-01-01", 100), 1: delta(2, "2030-01-01", 100)})
+    other.apply_reviews({1: delta(5, "2031-01-01", 300), 2: delta(1, "2029-01-01", 200)})
+    sent, received = sqlite.sync_to(other)
+    assert (sent, received) == (1, 2)  # 0 送過去；1 (對方比較新) 跟 2 收回來
+
+    cols = ['Times', 'Next', VERSION_COL]
+    pd.testing.assert_frame_equal(sqlite.load()[cols], other.load()[cols])
+    assert sqlite.load().at[1, 'Times'] == 5
+    assert sqlite.sync_to(other) == (0, 0)
+
+
+# --- Google Sheet (bench 的假 Sheet) ---
+class SheetConnection:
+    # st.connection("gsheets") 只用到 read / update
+    def read(self, worksheet=None, ttl=None):
+        return fakes.SHEET.df.copy()
+
+    def update(self, worksheet=None, data=None):
+        fakes.SHEET.replace(data)
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    import gspread
+    monkeypatch.setattr(fakes, "SHEET", fakes.FakeSheet(fakes.make_deck(5, seed=1)))
+    monkeypatch.setattr(gspread, "service_account_from_dict", lambda info: fakes.FakeGspreadClient())
+    store = GSheetsStorage(SheetConnection(), settings=fakes.FAKE_SETTINGS)
+    store.load()  # 第一次讀會補上 Updated / ID 欄
+    return store
+
+
+def sheet_row(card):
+    df = fakes.SHEET.df
+    return df[df['ID'].astype(str).str.removeprefix("'").astype(int) == card].iloc[0]
+
+
+def test_gsheets_load_assigns_ids(sheet):
+    assert sheet.load().index.tolist() == [0, 1, 2, 3, 4]
+    assert {'ID', VERSION_COL} <= set(fakes.SHEET.df.columns)
+
+
+def test_gsheets_apply_reviews_writes_cells_only(sheet):
+    assert sheet.apply_reviews({2: delta(4, "2030-01-01", 100)}) == {}
+    assert fakes.SHEET.full_writes == 0
+    row = sheet_row(2)
+    assert (row['Times'], row['Next'], row[VERSION_COL]) == (4, "2030-01-01", "'100")
+
+    rejected = sheet.apply_reviews({2: delta(1, "2020-01-01", 50)})
+    assert rejected == {2: delta(4, "2030-01-01", 100)}
+    assert sheet_row(2)['Times'] == 4
+
+
+def test_gsheets_apply_reviews_after_sheet_was_reordered(sheet):
+    sheet.apply_reviews({0: delta(1, "2030-01-01", 100)})  # 記住 ID → 列
+    fakes.SHEET.df = fakes.SHEET.df.iloc[::-1].reset_index(drop=True)  # 有人把 Sheet 反過來排序
+    before = fakes.SHEET.df.copy()
+
+    assert sheet.apply_reviews({0: delta(2, "2031-01-01", 200), 4: delta(3, "2032-01-01", 300)}) == {}
+    assert (sheet_row(0)['Times'], sheet_row(0)['Next']) == (2, "2031-01-01")
+    assert (sheet_row(4)['Times'], sheet_row(4)['Next']) == (3, "2032-01-01")
+    # 其他卡沒有被動到
+    for card in (1, 2, 3):
+        old = before[before['ID'] == card].iloc[0]
+        assert sheet_row(card)['Times'] == old['Times']
+    assert sheet.load().loc[[0, 4], 'Times'].tolist() == [2, 3]
+
+
+def test_gsheets_changes_since_returns_only_newer_rows(sheet):
+    known = sheet.load()[VERSION_COL]
+    rev = sheet.revision()
+    assert sheet.changes_since(rev, known=known).empty
+
+    sheet.apply_reviews({3: delta(6, "2030-01-01", 100)})
+    changed = sheet.changes_since(rev, known=known)
+    assert changed.index.tolist() == [3]
+    assert (changed.at[3, 'Times'], changed.at[3, 'Next']) == (6, date(2030, 1, 1))
+
+
+def test_sqlite_sync_to_gsheets(sheet, tmp_path):
+    local = SQLiteStorage(str(tmp_path / "local.db"))
+    local.write_all(sheet.load())
+    local.sync_to(sheet)
+
+    local.apply_reviews({0: delta(2, "2030-01-01", 100)})
+    sheet.apply_reviews({1: delta(5, "2031-01-01", 200)})
+    assert local.sync_to(sheet) == (1, 1)
+    assert sheet_row(0)['Times'] == 2
+    assert local.load().at[1, 'Times'] == 5
+    assert fakes.SHEET.full_writes == 0